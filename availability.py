@@ -0,0 +1,424 @@
+"""
+Slot engine for barber availability.
+
+Busy time (scheduled appointments + the barber's break) is loaded as a sorted,
+merged list of (start, end) intervals; each day's slice is turned into a
+minute bitmap (see occupancy.py) and free slots come from window ops on it
+instead of checking every candidate against every appointment.
+
+Computed days are kept in an in-process LRU keyed by (barber, date, duration).
+Write paths must call invalidate_day() / invalidate_barber() after committing
+anything that changes a barber's schedule.
+"""
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from database import begin_write_lock
+from occupancy import DayOccupancy, format_minute
+import models
+
+SLOT_STEP_MINUTES = 30
+DEFAULT_DURATION_MINUTES = 30
+MAX_RANGE_DAYS = 31
+# No appointment lasts longer than this; lets busy lookups bound start_time
+# from below so they stay a range scan on the appointments index
+MAX_APPOINTMENT_SPAN = timedelta(days=1)
+
+# Cache bounds. The TTL is a safety net for multi-worker setups, where a
+# write handled by another process cannot invalidate this process' entries.
+CACHE_MAX_ENTRIES = int(os.getenv("AVAILABILITY_CACHE_SIZE", "2048"))
+CACHE_TTL_SECONDS = int(os.getenv("AVAILABILITY_CACHE_TTL", "60"))
+
+Interval = Tuple[datetime, datetime]
+CacheKey = Tuple[int, date, int]  # (barber_id, date, duration_minutes)
+
+
+class SlotCache:
+    """Thread-safe LRU of computed slots with hit/miss counters"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[str]]]" = OrderedDict()
+        self._by_barber: Dict[int, Set[CacheKey]] = {}
+        self._generation: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, barber_id: int) -> int:
+        """Read before loading from the DB; pass to put() to drop stale results"""
+        with self._lock:
+            return self._generation.get(barber_id, 0)
+
+    def put(self, key: CacheKey, slots: List[str], generation: int):
+        with self._lock:
+            # An invalidation happened while we were computing: don't cache
+            if self._generation.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (time.monotonic(), slots)
+            self._entries.move_to_end(key)
+            self._by_barber.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self.evictions += 1
+
+    def invalidate(self, barber_id: int, day: Optional[date] = None):
+        """Drop one day (or every day when day is None) for a barber"""
+        with self._lock:
+            self._generation[barber_id] = self._generation.get(barber_id, 0) + 1
+            for key in list(self._by_barber.get(barber_id, ())):
+                if day is None or key[1] == day:
+                    del self._entries[key]
+                    self._forget(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_barber.clear()
+            self._generation.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _forget(self, key: CacheKey):
+        keys = self._by_barber.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_barber[key[0]]
+
+
+slot_cache = SlotCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+# Called with (barber_id, day) after an invalidation; day is None for "all days"
+_listeners: List[Callable[[int, Optional[date]], None]] = []
+
+
+def add_listener(callback: Callable[[int, Optional[date]], None]):
+    """Register a callback run after every invalidation"""
+    _listeners.append(callback)
+
+
+def invalidate_day(barber_id: Optional[int], day: date):
+    """A barber's day changed (appointment created or status changed)"""
+    if not barber_id:
+        return
+    slot_cache.invalidate(barber_id, day)
+    for callback in _listeners:
+        callback(barber_id, day)
+
+
+def invalidate_barber(barber_id: int):
+    """A barber's hours or break changed: every cached day is stale"""
+    slot_cache.invalidate(barber_id)
+    for callback in _listeners:
+        callback(barber_id, None)
+
+
+def parse_hhmm(value: str) -> Tuple[int, int]:
+    """Parse a "HH:MM" string into (hour, minute)"""
+    hour, minute = map(int, value.split(':'))
+    return hour, minute
+
+
+def day_bounds(barber: models.Barber, target_date: date) -> Tuple[datetime, datetime, Optional[Interval]]:
+    """Get (work_start, work_end, break_interval) for a barber on a given date"""
+    day_start = datetime.combine(target_date, datetime.min.time())
+    try:
+        start_hour, start_min = parse_hhmm(barber.start_time)
+        end_hour, end_min = parse_hhmm(barber.end_time)
+
+        # Parse break interval if exists
+        break_interval = None
+        if barber.start_interval and barber.end_interval:
+            bs_h, bs_m = parse_hhmm(barber.start_interval)
+            be_h, be_m = parse_hhmm(barber.end_interval)
+            break_interval = (
+                day_start.replace(hour=bs_h, minute=bs_m),
+                day_start.replace(hour=be_h, minute=be_m)
+            )
+    except (ValueError, AttributeError):
+        start_hour, start_min = 9, 0
+        end_hour, end_min = 18, 0
+        break_interval = None
+
+    work_start = day_start.replace(hour=start_hour, minute=start_min)
+    work_end = day_start.replace(hour=end_hour, minute=end_min)
+    return work_start, work_end, break_interval
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals by start and merge the overlapping/touching ones"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlaps_busy(busy: List[Interval], starts: List[datetime], start: datetime, end: datetime) -> bool:
+    """True when [start, end) overlaps any of the sorted, merged busy intervals"""
+    i = bisect_left(starts, end)
+    return i > 0 and busy[i - 1][1] > start
+
+
+def load_busy_by_barber(
+    db: Session,
+    barber_ids: List[int],
+    range_start: datetime,
+    range_end: datetime,
+    exclude_appointment_id: Optional[int] = None
+) -> Dict[int, List[Interval]]:
+    """Fetch scheduled appointments overlapping a range with one query, merged per barber"""
+    query = db.query(
+        models.Appointment.barber_id, models.Appointment.start_time, models.Appointment.end_time
+    ).filter(
+        models.Appointment.barber_id.in_(barber_ids),
+        models.Appointment.status == "scheduled",  # Only scheduled appointments block slots
+        models.Appointment.start_time > range_start - MAX_APPOINTMENT_SPAN,
+        models.Appointment.start_time < range_end,
+        models.Appointment.end_time > range_start
+    )
+    if exclude_appointment_id:
+        query = query.filter(models.Appointment.id != exclude_appointment_id)
+    rows = query.all()
+
+    intervals: Dict[int, List[Interval]] = {}
+    for row in rows:
+        intervals.setdefault(row.barber_id, []).append((row.start_time, row.end_time))
+    return {barber_id: merge_intervals(items) for barber_id, items in intervals.items()}
+
+
+def load_busy_intervals(
+    db: Session,
+    barber_id: int,
+    range_start: datetime,
+    range_end: datetime,
+    exclude_appointment_id: Optional[int] = None
+) -> List[Interval]:
+    """Fetch one barber's merged busy intervals for a range"""
+    return load_busy_by_barber(
+        db, [barber_id], range_start, range_end, exclude_appointment_id
+    ).get(barber_id, [])
+
+
+def day_occupancy(
+    db: Session,
+    barber_id: int,
+    day: date,
+    until: Optional[datetime] = None,
+    exclude_appointment_id: Optional[int] = None
+) -> DayOccupancy:
+    """Bitmap of a barber's scheduled appointments on a day (through `until` if later)"""
+    range_start = datetime.combine(day, datetime.min.time())
+    range_end = range_start + timedelta(days=1)
+    if until and until > range_end:
+        range_end = until
+    busy = load_busy_intervals(db, barber_id, range_start, range_end, exclude_appointment_id)
+    return DayOccupancy.from_intervals(day, busy)
+
+
+def build_day(
+    barber: models.Barber,
+    target_date: date,
+    busy: List[Interval],
+    starts: Optional[List[datetime]] = None
+) -> Tuple[DayOccupancy, datetime, datetime]:
+    """Occupancy bitmap (appointments + break) and working hours for one day"""
+    work_start, work_end, break_interval = day_bounds(barber, target_date)
+
+    # Slice the intervals that can touch this working day
+    if starts is None:
+        starts = [interval[0] for interval in busy]
+    lo = bisect_left(starts, work_start)
+    if lo > 0 and busy[lo - 1][1] > work_start:
+        lo -= 1
+    hi = bisect_left(starts, work_end, lo)
+
+    occupancy = DayOccupancy.from_intervals(target_date, busy[lo:hi])
+    if break_interval:
+        occupancy.mark(*break_interval)
+    return occupancy, work_start, work_end
+
+
+def iter_day_starts(
+    barber: models.Barber,
+    target_date: date,
+    duration_minutes: int,
+    busy: List[Interval],
+    starts: Optional[List[datetime]] = None
+) -> Iterator[datetime]:
+    """Free slot start times for one day from the barber's merged busy intervals"""
+    occupancy, work_start, work_end = build_day(barber, target_date, busy, starts)
+    return occupancy.free_starts(duration_minutes, work_start, work_end, SLOT_STEP_MINUTES)
+
+
+def day_slots(
+    barber: models.Barber,
+    target_date: date,
+    duration_minutes: int,
+    busy: List[Interval],
+    starts: Optional[List[datetime]] = None
+) -> List[str]:
+    """Compute free "HH:MM" slots for one day"""
+    occupancy, work_start, work_end = build_day(barber, target_date, busy, starts)
+    minutes = occupancy.free_minutes(
+        duration_minutes, occupancy.minute_of(work_start), occupancy.minute_of(work_end), SLOT_STEP_MINUTES
+    )
+    return [format_minute(minute) for minute in minutes]
+
+
+def range_slots(
+    db: Session,
+    barber: models.Barber,
+    start_date: date,
+    days: int,
+    duration_minutes: int
+) -> Dict[date, List[str]]:
+    """Compute free slots for a barber across consecutive days with one query"""
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    cached = {d: slot_cache.get((barber.id, d, duration_minutes)) for d in dates}
+    if all(slots is not None for slots in cached.values()):
+        return cached
+
+    generation = slot_cache.generation(barber.id)
+    range_start = datetime.combine(dates[0], datetime.min.time())
+    range_end = datetime.combine(dates[-1] + timedelta(days=1), datetime.min.time())
+
+    busy = load_busy_intervals(db, barber.id, range_start, range_end)
+    starts = [interval[0] for interval in busy]
+    result = {}
+    for d in dates:
+        result[d] = day_slots(barber, d, duration_minutes, busy, starts)
+        slot_cache.put((barber.id, d, duration_minutes), result[d], generation)
+    return result
+
+
+def earliest_slots(
+    db: Session,
+    candidates: List[Tuple[models.Barber, int, Optional[models.BarberService]]],
+    window_start: datetime,
+    window_end: datetime,
+    limit: int
+) -> List[Tuple[datetime, models.Barber, Optional[models.BarberService]]]:
+    """First free slots across several barbers, merged in start-time order
+
+    candidates holds (barber, duration_minutes, matching service) per barber.
+    """
+    if not candidates:
+        return []
+    busy_by_barber = load_busy_by_barber(
+        db, [barber.id for barber, _, _ in candidates], window_start, window_end
+    )
+
+    def barber_stream(index: int, barber: models.Barber, duration_minutes: int):
+        busy = busy_by_barber.get(barber.id, [])
+        starts = [interval[0] for interval in busy]
+        day = window_start.date()
+        while day <= window_end.date():
+            for slot in iter_day_starts(barber, day, duration_minutes, busy, starts):
+                if slot < window_start:
+                    continue
+                if slot + timedelta(minutes=duration_minutes) > window_end:
+                    return
+                # index breaks ties so barbers are never compared
+                yield slot, index
+            day += timedelta(days=1)
+
+    streams = [
+        barber_stream(index, barber, duration_minutes)
+        for index, (barber, duration_minutes, _) in enumerate(candidates)
+    ]
+    result = []
+    for slot, index in heapq.merge(*streams):
+        barber, _, service = candidates[index]
+        result.append((slot, barber, service))
+        if len(result) >= limit:
+            break
+    return result
+
+
+def nearest_free_starts(
+    barber: models.Barber,
+    occupancy: DayOccupancy,
+    start_time: datetime,
+    duration_minutes: int,
+    count: int,
+    not_before: Optional[datetime] = None
+) -> List[datetime]:
+    """The `count` free slots of the day closest to start_time (reuses a loaded occupancy)"""
+    work_start, work_end, break_interval = day_bounds(barber, occupancy.day)
+    day = DayOccupancy(occupancy.day, occupancy.bits)
+    if break_interval:
+        day.mark(*break_interval)
+
+    candidates = [
+        slot for slot in day.free_starts(duration_minutes, work_start, work_end, SLOT_STEP_MINUTES)
+        if not_before is None or slot >= not_before
+    ]
+    return sorted(candidates, key=lambda slot: (abs(slot - start_time), slot))[:count]
+
+
+def lock_barber(db: Session, barber_id: int) -> Optional[models.Barber]:
+    """Load a barber holding its row lock until commit
+
+    Bookings for the same barber serialize on this lock (SELECT ... FOR UPDATE
+    on MySQL, BEGIN IMMEDIATE on SQLite), so the conflict check and the INSERT
+    that follows are atomic. Bookings for other barbers are not blocked on
+    databases with row locks.
+    """
+    begin_write_lock(db)
+    return db.query(models.Barber).filter(models.Barber.id == barber_id).with_for_update().first()
+
+
+def resolve_duration(
+    db: Session,
+    barber_id: int,
+    barber_service_id: Optional[int] = None,
+    service_id: Optional[int] = None
+) -> int:
+    """Get the service duration in minutes, falling back to the default"""
+    if barber_service_id:
+        barber_service = db.query(models.BarberService).filter(
+            models.BarberService.id == barber_service_id,
+            models.BarberService.barber_id == barber_id
+        ).first()
+        if barber_service:
+            return barber_service.duration_minutes
+    elif service_id:
+        service = db.query(models.Service).filter(models.Service.id == service_id).first()
+        if service:
+            return service.duration_minutes
+    return DEFAULT_DURATION_MINUTES
@@ -0,0 +1,172 @@
+"""
+Server-push channel for availability updates.
+
+Clients subscribe to a (barber, date, duration) key and receive the slot list
+once, then only diffs. The broadcaster listens to
+availability.invalidate_day() / invalidate_barber(), which write paths call
+after committing; the new slots are computed once per subscribed key with a
+short-lived session and fanned out to every subscriber queue, so idle
+connections never hold a DB session.
+
+State is per process: with several workers each one serves its own clients
+and only sees the writes it handled itself.
+"""
+import asyncio
+import json
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+import availability
+import models
+
+HEARTBEAT_SECONDS = 25
+QUEUE_SIZE = 16
+
+Key = Tuple[int, date, int]  # (barber_id, date, duration_minutes)
+
+
+class Subscription:
+    """One connected client: its queue and the last slot list it was sent"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.slots: Optional[List[str]] = None  # None until the snapshot is taken
+
+    def snapshot(self, slots: List[str]):
+        """Record the initial list sent to the client.
+
+        Taken after subscribing, so no change can fall between the two. If a
+        refresh already ran in the meantime it queued a full list computed
+        after the change, which the client applies after the snapshot.
+        """
+        if self.slots is None:
+            self.slots = slots
+
+
+class SlotBroadcaster:
+    """Fan out slot diffs to subscribers grouped by (barber, date, duration)"""
+
+    def __init__(self):
+        self._subscribers: Dict[Key, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, key: Key) -> Subscription:
+        """Register a subscriber, before its snapshot (must be called from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, key: Key, subscription: Subscription):
+        """Remove a subscriber, dropping the key when it has no one left"""
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[key]
+
+    def notify_day(self, barber_id: int, day: date):
+        """Schedule a refresh for everyone watching this barber on this day (thread-safe)"""
+        with self._lock:
+            keys = [k for k in self._subscribers if k[0] == barber_id and k[1] == day]
+        self._schedule(keys)
+
+    def notify_barber(self, barber_id: int):
+        """Schedule a refresh for every day watched for this barber (thread-safe)"""
+        with self._lock:
+            keys = [k for k in self._subscribers if k[0] == barber_id]
+        self._schedule(keys)
+
+    def _schedule(self, keys: List[Key]):
+        loop = self._loop
+        if not keys or loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(lambda: loop.create_task(self._refresh(keys)))
+
+    async def _refresh(self, keys: List[Key]):
+        slots_by_key = await run_in_threadpool(compute_slots, keys)
+        for key, slots in slots_by_key.items():
+            with self._lock:
+                subscribers = list(self._subscribers.get(key, ()))
+            for subscription in subscribers:
+                self._push(subscription, slots)
+
+    @staticmethod
+    def _push(subscription: Subscription, slots: List[str]):
+        if subscription.slots is None:
+            # Changed while the snapshot was being taken: send the full list
+            subscription.slots = slots
+            subscription.queue.put_nowait(("slots", {"slots": slots}))
+            return
+        old, new = set(subscription.slots), set(slots)
+        added = sorted(new - old)
+        removed = sorted(old - new)
+        if not added and not removed:
+            return
+        subscription.slots = slots
+        try:
+            subscription.queue.put_nowait(("diff", {"added": added, "removed": removed}))
+        except asyncio.QueueFull:
+            # Slow client: drop the backlog and resync with the full list
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(("slots", {"slots": slots}))
+
+
+def compute_slots(keys: List[Key]) -> Dict[Key, List[str]]:
+    """Recompute slots for each key using a single short-lived session"""
+    db = SessionLocal()
+    try:
+        result = {}
+        for barber_id, day, duration_minutes in keys:
+            barber = db.query(models.Barber).filter(models.Barber.id == barber_id).first()
+            if not barber or not barber.is_active:
+                result[(barber_id, day, duration_minutes)] = []
+                continue
+            slots_by_day = availability.range_slots(db, barber, day, 1, duration_minutes)
+            result[(barber_id, day, duration_minutes)] = slots_by_day[day]
+        return result
+    finally:
+        db.close()
+
+
+def subscription_key(
+    barber_id: int,
+    day: date,
+    barber_service_id: Optional[int] = None,
+    service_id: Optional[int] = None
+) -> Key:
+    """Resolve the subscription key for a new subscriber (404 for an unknown barber)"""
+    db = SessionLocal()
+    try:
+        if not db.query(models.Barber.id).filter(models.Barber.id == barber_id).first():
+            raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
+        duration_minutes = availability.resolve_duration(db, barber_id, barber_service_id, service_id)
+        return (barber_id, day, duration_minutes)
+    finally:
+        db.close()
+
+
+def format_event(event: str, data: dict) -> str:
+    """Serialize an SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+broadcaster = SlotBroadcaster()
+
+
+def _on_invalidate(barber_id: int, day: Optional[date]):
+    if day is None:
+        broadcaster.notify_barber(barber_id)
+    else:
+        broadcaster.notify_day(barber_id, day)
+
+
+availability.add_listener(_on_invalidate)
@@ -0,0 +1,700 @@
+"""
+Benchmarks for the hot paths of the API.
+
+Usage:
+    python benchmark.py slots [--appointments 16] [--iterations 2000]
+    python benchmark.py booking-race [--clients 200] [--barbers 8]
+    python benchmark.py booking-path [--requests 300] [--rtt-ms 0] [--legacy]
+    python benchmark.py metrics-overhead [--requests 20000]
+    python benchmark.py mixed-load [--readers 16] [--writers 4] [--seconds 5]
+    python benchmark.py login-burst [--logins 64] [--probes 4] [--seconds 3]
+    python benchmark.py auth-cost [--requests 2000]
+    python benchmark.py bcrypt-costs [--min 10] [--max 14] [--seconds 1]
+
+Each subcommand prints its own summary; correctness checks (one winner per
+slot, indexed queries, query budgets) live in tests/ and run with pytest, which
+has its own copies of the helpers below. Nothing here touches barbershop.db:
+commands that need a database create a throwaway SQLite file unless
+--database-url is given.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from occupancy import DayOccupancy, format_minute
+
+
+def timed(fn, iterations: int) -> float:
+    """Average seconds per call of fn over `iterations` runs"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+# =============== SLOTS: nested loop vs bitmap ===============
+
+def legacy_slots(work_start, work_end, break_start, break_end, duration_minutes, appointments):
+    """The original get_availability loop: every candidate vs every appointment"""
+    slots = []
+    current_time = work_start
+    while current_time + timedelta(minutes=duration_minutes) <= work_end:
+        slot_end = current_time + timedelta(minutes=duration_minutes)
+        if break_start and break_end:
+            if (current_time < break_end) and (slot_end > break_start):
+                current_time += timedelta(minutes=30)
+                continue
+        is_free = True
+        for apt in appointments:
+            if (current_time < apt.end_time) and (slot_end > apt.start_time):
+                is_free = False
+                break
+        if is_free:
+            slots.append(current_time.strftime("%H:%M"))
+        current_time += timedelta(minutes=30)
+    return slots
+
+
+def bitmap_slots(day, work_start, work_end, break_start, break_end, duration_minutes, appointments):
+    occupancy = DayOccupancy.from_intervals(day, ((a.start_time, a.end_time) for a in appointments))
+    occupancy.mark(break_start, break_end)
+    minutes = occupancy.free_minutes(
+        duration_minutes, occupancy.minute_of(work_start), occupancy.minute_of(work_end), 30
+    )
+    return [format_minute(minute) for minute in minutes]
+
+
+def bench_slots(args):
+    random.seed(42)
+    day = date(2030, 1, 7)
+    base = datetime.combine(day, datetime.min.time())
+    work_start, work_end = base.replace(hour=8), base.replace(hour=20)
+    break_start, break_end = base.replace(hour=12), base.replace(hour=13)
+
+    appointments = []
+    for _ in range(args.appointments):
+        start = base.replace(hour=random.randint(8, 19), minute=random.choice([0, 15, 30, 45]))
+        appointments.append(SimpleNamespace(
+            start_time=start, end_time=start + timedelta(minutes=random.choice([20, 30, 45]))
+        ))
+
+    print(f"Day 08:00-20:00, {args.appointments} appointments, {args.iterations} iterations\n")
+    print(f"{'duration':>8} | {'loop (us)':>10} | {'bitmap (us)':>11} | {'speedup':>7}")
+    for duration in (15, 30, 45, 60, 90):
+        t_legacy = timed(lambda: legacy_slots(
+            work_start, work_end, break_start, break_end, duration, appointments), args.iterations)
+        t_bitmap = timed(lambda: bitmap_slots(
+            day, work_start, work_end, break_start, break_end, duration, appointments), args.iterations)
+        print(f"{duration:>8} | {t_legacy * 1e6:>10.1f} | {t_bitmap * 1e6:>11.1f} | {t_legacy / t_bitmap:>6.1f}x")
+
+
+# =============== DATABASE HELPERS ===============
+
+def setup_database(database_url=None):
+    """Point the app at a benchmark database and create the tables"""
+    if not database_url:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    os.environ["DATABASE_URL"] = database_url
+    import database
+    import models
+    models.Base.metadata.create_all(bind=database.engine)
+    print(f"Database: {database_url}\n")
+    return database
+
+
+def create_barber_with_service(db, name: str):
+    import models
+    barber = models.Barber(name=name, start_time="09:00", end_time="18:00")
+    db.add(barber)
+    db.flush()
+    service = models.BarberService(barber_id=barber.id, name="Corte", duration_minutes=30, price=30.0)
+    db.add(service)
+    db.commit()
+    return barber.id, service.id
+
+
+def book_once(database, barber_id: int, service_id: int, start_time: datetime) -> int:
+    """Run the real booking endpoint with its own session; returns the HTTP status"""
+    from fastapi import HTTPException
+    import schemas
+    from routers.user import book_appointment
+
+    db = database.SessionLocal()
+    try:
+        book_appointment(schemas.AppointmentCreate(
+            customer_name="Benchmark",
+            customer_phone="11999990000",
+            barber_id=barber_id,
+            barber_service_id=service_id,
+            start_time=start_time
+        ), None, db)
+        return 200
+    except HTTPException as e:
+        return e.status_code
+    finally:
+        db.close()
+
+
+# =============== BOOKING RACE ===============
+
+def bench_booking_race(args):
+    database = setup_database(args.database_url)
+    db = database.SessionLocal()
+    try:
+        barbers = [create_barber_with_service(db, f"Barbeiro {i}") for i in range(args.barbers)]
+    finally:
+        db.close()
+    day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+
+    # 1. Everyone fights for the same slot: exactly one must win
+    barber_id, service_id = barbers[0]
+    slot = day.replace(hour=10)
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        statuses = list(pool.map(lambda _: book_once(database, barber_id, service_id, slot), range(args.clients)))
+    wins, conflicts = statuses.count(200), statuses.count(409)
+    others = len(statuses) - wins - conflicts
+    print(f"Same slot, {args.clients} parallel clients: {wins} booked, {conflicts} got 409, {others} other errors")
+
+    # 2. Throughput when each client books a different barber/slot
+    jobs = []
+    for i in range(args.clients):
+        barber_id, service_id = barbers[i % len(barbers)]
+        jobs.append((barber_id, service_id, day.replace(hour=11) + timedelta(days=1 + i // len(barbers))))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(args.clients, 32)) as pool:
+        statuses = list(pool.map(lambda job: book_once(database, *job), jobs))
+    elapsed = time.perf_counter() - start
+    print(f"Distinct slots across {len(barbers)} barbers: {statuses.count(200)}/{len(jobs)} booked, "
+          f"{len(jobs) / elapsed:.0f} bookings/s")
+
+
+# =============== BOOKING PATH ===============
+
+# Statements per POST /book besides BEGIN/COMMIT, first booking of a day
+# included; keep in step with QUERY_BUDGETS["POST /book"] in tests/test_query_counts.py
+BOOKING_QUERY_BUDGET = 5
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def legacy_booking_endpoint():
+    """The original POST /book flow: a query per lookup, then a refresh and lazy loads after commit.
+
+    It records the same price snapshot and rollup as today's endpoint, so only
+    the request flow differs between the two runs.
+    """
+    from typing import Optional
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+    import availability
+    import models
+    import schemas
+    import stats
+    from database import get_db
+    from routers.customer import get_current_customer
+    from routers.user import ensure_slot_free, resolve_booking_duration, validate_booking_barber
+
+    def book_appointment(
+        appointment: schemas.AppointmentCreate,
+        customer_token: Optional[str] = None,
+        db: Session = Depends(get_db)
+    ):
+        barber = validate_booking_barber(db, appointment.barber_id)
+        duration_minutes = resolve_booking_duration(
+            db, appointment.barber_id, appointment.barber_service_id, appointment.service_id
+        )
+        customer_id = None
+        if customer_token:
+            customer = get_current_customer(customer_token, db)
+            if customer:
+                customer_id = customer.id
+        end_time = appointment.start_time + timedelta(minutes=duration_minutes)
+        ensure_slot_free(db, barber, appointment.start_time, end_time)
+
+        # Already in the identity map from resolve_booking_duration: no query
+        barber_service = db.get(models.BarberService, appointment.barber_service_id) \
+            if appointment.barber_service_id else None
+        service = db.get(models.Service, appointment.service_id) \
+            if appointment.service_id and not barber_service else None
+        db_appointment = models.Appointment(
+            **appointment.model_dump(),
+            **stats.service_snapshot(barber_service, service),
+            customer_id=customer_id,
+            end_time=end_time
+        )
+        db.add(db_appointment)
+        db.flush()
+        stats.record_appointments(db, [db_appointment], 1)
+        db.commit()
+        db.refresh(db_appointment)
+        availability.invalidate_day(db_appointment.barber_id, db_appointment.start_time.date())
+        return db_appointment
+
+    return book_appointment
+
+
+def bench_booking_path(args):
+    database = setup_database(args.database_url)
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    import main
+    import schemas
+
+    path = "/book"
+    if args.legacy:
+        path = "/benchmark/legacy-book"
+        main.app.add_api_route(
+            path, legacy_booking_endpoint(), methods=["POST"], response_model=schemas.Appointment
+        )
+
+    db = database.SessionLocal()
+    try:
+        barber_id, service_id = create_barber_with_service(db, "Barbeiro")
+    finally:
+        db.close()
+
+    client = TestClient(main.app)
+    phone = "11977776666"
+    token = client.post("/customer/register", json={
+        "name": "Benchmark", "phone": phone, "password": "benchmark"
+    }).json()["access_token"]
+
+    # Count statements per request; optionally emulate a remote DB's latency
+    statements = []
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        if args.rtt_ms:
+            time.sleep(args.rtt_ms / 1000)
+
+    day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    latencies, round_trips, over_budget = [], [], 0
+    for i in range(args.requests):
+        start_time = day + timedelta(days=i // 18, hours=9, minutes=30 * (i % 18))
+        statements.clear()
+        t0 = time.perf_counter()
+        response = client.post(f"{path}?customer_token={token}", json={
+            "customer_name": "Benchmark",
+            "customer_phone": phone,
+            "barber_id": barber_id,
+            "barber_service_id": service_id,
+            "start_time": start_time.isoformat()
+        })
+        latencies.append(time.perf_counter() - t0)
+        round_trips.append(len(statements) + 1)  # + COMMIT
+        if sum(not s.startswith("BEGIN") for s in statements) > BOOKING_QUERY_BUDGET:
+            over_budget += 1
+        assert response.status_code == 200, response.text
+
+    print(f"{args.requests} bookings via the {'legacy' if args.legacy else 'current'} path, "
+          f"simulated RTT {args.rtt_ms} ms")
+    print(f"DB round trips per request: {min(round_trips)}-{max(round_trips)}")
+    print(f"Statements: {' | '.join(s.split()[0] for s in statements)}")
+    print(f"Over the budget of {BOOKING_QUERY_BUDGET} statements: {over_budget}/{args.requests} requests")
+    print(f"Latency p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+# =============== QUERY COUNTING ===============
+
+@contextmanager
+def count_queries(engine, max_queries=None, label="block"):
+    """Collect the statements run on `engine` inside the block; fail if more than max_queries"""
+    from sqlalchemy import event
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # SQLite's explicit BEGIN (see database.py) has no counterpart on MySQL
+        if not statement.startswith("BEGIN"):
+            statements.append(" ".join(statement.split()))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    if max_queries is not None and len(statements) > max_queries:
+        listing = "\n  ".join(s[:120] for s in statements)
+        raise AssertionError(f"{label}: {len(statements)} statements, budget {max_queries}:\n  {listing}")
+
+
+# =============== METRICS: middleware overhead ===============
+
+def bench_metrics_overhead(args):
+    import asyncio
+    setup_database(args.database_url)
+    from instrumentation import MetricsMiddleware, metrics
+
+    route = SimpleNamespace(path="/panel/barbers/{barber_id}")
+
+    async def endpoint(scope, receive, send):
+        # What the router does on a match, then the smallest possible response
+        scope["route"] = route
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"x" * 256, "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def latencies(app):
+        samples = []
+        for i in range(args.requests):
+            scope = {"type": "http", "method": "GET", "path": f"/panel/barbers/{i % 50}"}
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    bare = asyncio.run(latencies(endpoint))
+    instrumented = asyncio.run(latencies(MetricsMiddleware(endpoint)))
+    render_seconds = timed(metrics.render, 200)
+
+    print(f"{'':<14} | {'p50 (us)':>9} | {'p99 (us)':>9}")
+    for label, samples in (("bare", bare), ("with metrics", instrumented)):
+        print(f"{label:<14} | {percentile(samples, 50) * 1e6:>9.2f} | {percentile(samples, 99) * 1e6:>9.2f}")
+    added = (sum(instrumented) - sum(bare)) / args.requests
+    print(f"\nAdded per request: {added * 1e6:.2f} us; /metrics render: {render_seconds * 1e3:.3f} ms")
+    # All requests share one route template, however many raw paths they hit
+    assert len(metrics.latency) == 1, f"expected one series, got {sorted(metrics.latency)}"
+
+
+# =============== MIXED LOAD: SQLite defaults vs tuned pragmas ===============
+
+def mixed_load_worker(role, barber, barbers, seconds, ready, results):
+    """One reader (GET /availability) or writer (POST /book) process"""
+    import database
+    from routers.user import get_availability
+
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    samples, errors = [], []
+    rng = random.Random()
+    ready.wait()
+    deadline = time.perf_counter() + seconds
+    booked = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if role == "read":
+            barber_id, service_id = rng.choice(barbers)
+            db = database.SessionLocal()
+            try:
+                day = (tomorrow + timedelta(days=rng.randrange(7))).date()
+                get_availability(day.isoformat(), barber_id, service_id, None, db)
+                status = 200
+            except Exception as e:
+                status = repr(e)
+            finally:
+                db.close()
+        else:
+            # Each writer owns a barber and walks its half-hour slots from 09:00 to 18:00
+            slot = tomorrow + timedelta(days=booked // 18, hours=9, minutes=30 * (booked % 18))
+            booked += 1
+            try:
+                status = book_once(database, *barber, slot)
+            except Exception as e:
+                status = repr(e)
+        if status == 200:
+            samples.append(time.perf_counter() - started)
+        else:
+            errors.append(str(status))
+    results.put((role, samples, errors))
+
+
+def run_mixed_load(args) -> dict:
+    """Seed a database, then run the readers and writers as separate processes"""
+    import multiprocessing
+    database = setup_database(args.database_url)
+
+    db = database.SessionLocal()
+    try:
+        barbers = [create_barber_with_service(db, f"Barbeiro {i}") for i in range(max(args.writers, 4))]
+    finally:
+        db.close()
+    database.engine.dispose()
+
+    # Processes rather than threads: with threads the GIL, not SQLite, decides who waits
+    context = multiprocessing.get_context("spawn")
+    roles = ["read"] * args.readers + ["write"] * args.writers
+    ready = context.Barrier(len(roles) + 1)
+    results = context.Queue()
+    workers = [
+        context.Process(target=mixed_load_worker, args=(
+            role, barbers[i - args.readers] if role == "write" else None, barbers, args.seconds, ready, results
+        ))
+        for i, role in enumerate(roles)
+    ]
+    for worker in workers:
+        worker.start()
+    ready.wait()  # everyone has imported the app
+    reads, writes, errors = [], [], []
+    for _ in workers:
+        role, samples, failed = results.get()
+        (reads if role == "read" else writes).extend(samples)
+        errors += failed
+    for worker in workers:
+        worker.join()
+
+    return {
+        "reads_per_s": len(reads) / args.seconds,
+        "read_p50_ms": percentile(reads, 50) * 1000 if reads else 0,
+        "read_p99_ms": percentile(reads, 99) * 1000 if reads else 0,
+        "writes_per_s": len(writes) / args.seconds,
+        "write_p99_ms": percentile(writes, 99) * 1000 if writes else 0,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def bench_mixed_load(args):
+    if args.mode:
+        print("RESULT " + json.dumps(run_mixed_load(args)))
+        return
+
+    # The engine reads its settings at import, so each configuration gets its own process
+    results = {}
+    for mode, tuned in (("default", "0"), ("tuned", "1")):
+        command = [sys.executable, os.path.abspath(__file__), "mixed-load", "--mode", mode,
+                   "--readers", str(args.readers), "--writers", str(args.writers), "--seconds", str(args.seconds)]
+        if args.database_url:
+            command += ["--database-url", args.database_url]
+        # No slot cache, so every read reaches the database
+        env = dict(os.environ, SQLITE_TUNED=tuned, AVAILABILITY_CACHE_SIZE="0")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(output.split("RESULT ", 1)[1])
+
+    print(f"{args.readers} readers (GET /availability) + {args.writers} writers (POST /book), {args.seconds}s each\n")
+    print(f"{'settings':<8} | {'reads/s':>8} | {'read p50':>9} | {'read p99':>9} | {'books/s':>8} | {'book p99':>9} | errors")
+    for mode, r in results.items():
+        print(f"{mode:<8} | {r['reads_per_s']:>8.0f} | {r['read_p50_ms']:>7.1f}ms | {r['read_p99_ms']:>7.1f}ms | "
+              f"{r['writes_per_s']:>8.0f} | {r['write_p99_ms']:>7.1f}ms | {r['errors']}")
+    for mode, r in results.items():
+        if r["first_error"]:
+            print(f"  {mode}: first error: {r['first_error']}")
+
+
+# =============== LOGIN BURST: bcrypt vs the event loop ===============
+
+class InlineHashing:
+    """The old behaviour, for comparison: bcrypt runs on the caller's thread"""
+
+    def run(self, fn, *args):
+        return fn(*args)
+
+    async def run_async(self, fn, *args):
+        return fn(*args)
+
+
+def bench_login_burst(args):
+    import asyncio
+    import httpx
+    database = setup_database(args.database_url)
+    import main
+    import models
+    from routers import auth
+
+    db = database.SessionLocal()
+    try:
+        db.add(models.User(username="benchmark", hashed_password=auth.get_password_hash("benchmark"), is_admin=True))
+        db.commit()
+        barber_id, service_id = create_barber_with_service(db, "Barbeiro")
+    finally:
+        db.close()
+    tomorrow = date.today() + timedelta(days=1)
+    probe_urls = ["/barbers", f"/availability?date_str={tomorrow}&barber_id={barber_id}&barber_service_id={service_id}"]
+
+    started = time.perf_counter()
+    auth._checkpw("benchmark", auth.get_password_hash("benchmark"))
+    one_hash = time.perf_counter() - started
+
+    async def phase(logins: int):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            latencies, statuses = [], []
+            deadline = time.perf_counter() + args.seconds
+
+            async def probe(url):
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    assert response.status_code == 200, f"{url}: {response.status_code}"
+                    latencies.append(time.perf_counter() - started)
+                    await asyncio.sleep(0.01)
+
+            async def login():
+                response = await client.post("/auth/login", data={"username": "benchmark", "password": "benchmark"})
+                statuses.append(response.status_code)
+
+            probes = [probe(probe_urls[i % len(probe_urls)]) for i in range(args.probes)]
+            await asyncio.gather(*probes, *[login() for _ in range(logins)])
+            return latencies, statuses
+
+    results = {"quiet": asyncio.run(phase(0))}
+    pool = auth.hashing_pool
+    auth.hashing_pool = InlineHashing()
+    try:
+        results["burst, inline bcrypt"] = asyncio.run(phase(args.logins))
+    finally:
+        auth.hashing_pool = pool
+    results["burst, hashing pool"] = asyncio.run(phase(args.logins))
+
+    print(f"One bcrypt verification: {one_hash * 1000:.0f} ms; {args.logins} logins per burst, "
+          f"{args.probes} clients probing {' and '.join(url.split('?')[0] for url in probe_urls)}\n")
+    print(f"{'phase':<22} | {'probes':>6} | {'p50':>8} | {'p99':>8} | logins")
+    for label, (latencies, statuses) in results.items():
+        outcome = ", ".join(f"{statuses.count(code)}x{code}" for code in sorted(set(statuses))) or "-"
+        print(f"{label:<22} | {len(latencies):>6} | {percentile(latencies, 50) * 1000:>6.1f}ms | "
+              f"{percentile(latencies, 99) * 1000:>6.1f}ms | {outcome}")
+
+    # With the pool nothing waits behind a whole hash; inline, probes queue behind every one
+    latencies, statuses = results["burst, hashing pool"]
+    assert percentile(latencies, 99) < one_hash, "Non-auth requests waited behind bcrypt"
+    assert set(statuses) <= {200, 503}, f"Unexpected login statuses: {sorted(set(statuses))}"
+
+
+# =============== AUTH COST: principal cache ===============
+
+def bench_auth_cost(args):
+    database = setup_database(args.database_url)
+    import models
+    from routers import auth
+
+    db = database.SessionLocal()
+    try:
+        db.add(models.User(username="benchmark", hashed_password=auth.get_password_hash("benchmark"), is_admin=True))
+        db.commit()
+    finally:
+        db.close()
+    token = auth.create_access_token({"sub": "benchmark", "role": "admin"})
+
+    def resolve():
+        # What each panel request does: a fresh session plus the dependency
+        db = database.SessionLocal()
+        try:
+            return auth.get_current_admin_user(auth.get_current_user(token, db))
+        finally:
+            db.close()
+
+    def cold():
+        auth.principal_cache.clear()
+        return resolve()
+
+    resolve()
+    with count_queries(database.engine) as cold_statements:
+        cold()
+    resolve()
+    with count_queries(database.engine) as warm_statements:
+        resolve()
+
+    cold_seconds = timed(cold, args.requests)
+    warm_seconds = timed(resolve, args.requests)
+    print(f"{'get_current_user':<18} | {'us/request':>10} | queries")
+    print(f"{'cold cache':<18} | {cold_seconds * 1e6:>10.1f} | {len(cold_statements)}")
+    print(f"{'warm cache':<18} | {warm_seconds * 1e6:>10.1f} | {len(warm_statements)}")
+    print(f"\n{cold_seconds / warm_seconds:.0f}x faster on a hit; counters: {auth.principal_cache.stats()}")
+
+
+# =============== BCRYPT COSTS: login capacity per work factor ===============
+
+def bench_bcrypt_costs(args):
+    import bcrypt
+    import hashing
+
+    def rate(hashed: bytes, threads: int) -> float:
+        """Verifications per second with `threads` verifying at once for args.seconds"""
+        def worker(_):
+            done, deadline = 0, time.perf_counter() + args.seconds
+            while not done or time.perf_counter() < deadline:
+                bcrypt.checkpw(b"benchmark", hashed)
+                done += 1
+            return done
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            done = sum(pool.map(worker, range(threads)))
+        return done / (time.perf_counter() - started)
+
+    calibrated = hashing.bcrypt_rounds()
+    source = f"BCRYPT_ROUNDS={hashing.BCRYPT_ROUNDS}" if hashing.BCRYPT_ROUNDS else f"target {hashing.BCRYPT_TARGET_MS:.0f} ms, saved in {hashing.BCRYPT_ROUNDS_FILE}"
+    print(f"{os.cpu_count()} CPUs, HASH_WORKERS={hashing.HASH_WORKERS}; cost in use: {calibrated} ({source})\n")
+    print(f"{'cost':>4} | {'ms/verify':>9} | {'per thread/s':>12} | {'pool/s':>8} | logins/min")
+    for rounds in range(args.min, args.max + 1):
+        hashed = bcrypt.hashpw(b"benchmark", bcrypt.gensalt(rounds=rounds))
+        single = rate(hashed, 1)
+        pooled = rate(hashed, hashing.HASH_WORKERS)
+        marker = "  <- in use" if rounds == calibrated else ""
+        print(f"{rounds:>4} | {1000 / single:>9.1f} | {single:>12.1f} | {pooled:>8.1f} | {pooled * 60:>10.0f}{marker}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_slots = sub.add_parser("slots", help="Slot generation: nested loop vs occupancy bitmap")
+    p_slots.add_argument("--appointments", type=int, default=16)
+    p_slots.add_argument("--iterations", type=int, default=2000)
+    p_slots.set_defaults(func=bench_slots)
+
+    p_race = sub.add_parser("booking-race", help="Parallel bookings: one contested slot, then throughput on distinct slots")
+    p_race.add_argument("--clients", type=int, default=200)
+    p_race.add_argument("--barbers", type=int, default=8)
+    p_race.add_argument("--database-url", default=None)
+    p_race.set_defaults(func=bench_booking_race)
+
+    p_path = sub.add_parser("booking-path", help="DB round trips and latency of POST /book")
+    p_path.add_argument("--requests", type=int, default=300)
+    p_path.add_argument("--rtt-ms", type=float, default=0)
+    p_path.add_argument("--database-url", default=None)
+    p_path.add_argument("--legacy", action="store_true",
+                        help="run the original flow (a query per lookup, refresh after commit) for comparison")
+    p_path.set_defaults(func=bench_booking_path)
+
+
+
+    p_metrics = sub.add_parser("metrics-overhead", help="Latency added by the Prometheus metrics middleware")
+    p_metrics.add_argument("--requests", type=int, default=20000)
+    p_metrics.add_argument("--database-url", default=None)
+    p_metrics.set_defaults(func=bench_metrics_overhead)
+
+    p_mixed = sub.add_parser("mixed-load", help="Availability reads plus bookings: SQLite defaults vs tuned pragmas")
+    p_mixed.add_argument("--readers", type=int, default=16)
+    p_mixed.add_argument("--writers", type=int, default=4)
+    p_mixed.add_argument("--seconds", type=float, default=5)
+    p_mixed.add_argument("--mode", choices=["default", "tuned"], default=None, help=argparse.SUPPRESS)
+    p_mixed.add_argument("--database-url", default=None)
+    p_mixed.set_defaults(func=bench_mixed_load)
+
+    p_burst = sub.add_parser("login-burst", help="p99 of non-auth routes while a burst of logins hashes passwords")
+    p_burst.add_argument("--logins", type=int, default=64)
+    p_burst.add_argument("--probes", type=int, default=4)
+    p_burst.add_argument("--seconds", type=float, default=3)
+    p_burst.add_argument("--database-url", default=None)
+    p_burst.set_defaults(func=bench_login_burst)
+
+    p_auth = sub.add_parser("auth-cost", help="Cost per request of the auth dependency, cold vs cached")
+    p_auth.add_argument("--requests", type=int, default=2000)
+    p_auth.add_argument("--database-url", default=None)
+    p_auth.set_defaults(func=bench_auth_cost)
+
+    p_costs = sub.add_parser("bcrypt-costs", help="Hashes per second at each bcrypt cost on this host")
+    p_costs.add_argument("--min", type=int, default=10)
+    p_costs.add_argument("--max", type=int, default=14)
+    p_costs.add_argument("--seconds", type=float, default=1)
+    p_costs.set_defaults(func=bench_bcrypt_costs)
+
+    args = parser.parse_args()
+    args.func(args)
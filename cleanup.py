@@ -1,5 +1,5 @@
 """
-Cleanup script for expired appointment media.
+Cleanup script for expired appointment media and login audit rows.
 Run this via cron or Windows Task Scheduler to cleanup media older than 7 days.
 
 Usage:
@@ -97,11 +97,24 @@ def cleanup_orphan_files():
         db.close()
 
 
+def cleanup_login_audit():
+    """Delete login audit rows older than LOGIN_AUDIT_RETENTION_DAYS"""
+    from routers.auth import prune_login_audit
+    db: Session = SessionLocal()
+    
+    try:
+        deleted = prune_login_audit(db)
+        print(f"Deleted {deleted} expired login audit rows")
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
     print(f"Starting media cleanup at {datetime.now().isoformat()}")
     print(f"Retention period: {RETENTION_DAYS} days\n")
     
     cleanup_expired_media()
     cleanup_orphan_files()
+    cleanup_login_audit()
     
     print(f"\nCleanup completed at {datetime.now().isoformat()}")
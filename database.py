@@ -1,28 +1,217 @@
+import logging
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
 
 # Default to SQLite for local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./barbershop.db")
 
+# Where the app keeps its own small state files (calibrated bcrypt cost, login
+# limiter): next to the SQLite database, else the working directory
+_database_file = make_url(DATABASE_URL).database if DATABASE_URL.startswith("sqlite") else None
+DATA_DIR = os.getenv("DATA_DIR") or (
+    os.path.dirname(os.path.abspath(_database_file))
+    if _database_file and _database_file != ":memory:" else os.getcwd()
+)
+
+# Connection pool (QueuePool): connections kept open, extra ones allowed under
+# load, seconds to wait for a free one, and a liveness check on checkout
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0").lower() in ("1", "true", "yes")
+
+# SQLite pragmas applied to every new connection. WAL lets readers run while a
+# writer holds the lock; synchronous=NORMAL is durable in WAL mode except for
+# the last commits on power loss. SQLITE_TUNED=0 keeps SQLite's own defaults.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1").lower() in ("1", "true", "yes")
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-20000")),  # negative = KiB, so 20 MB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+}
+
 # Handle MySQL connection args
 connect_args = {}
 if "sqlite" in DATABASE_URL:
     connect_args = {"check_same_thread": False}
 
+pool_args = {}
+if ":memory:" not in DATABASE_URL:  # in-memory SQLite uses a per-thread pool instead
+    pool_args = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
 engine = create_engine(
     DATABASE_URL, 
     connect_args=connect_args,
     # Add pool_recycle for MySQL to prevent connection timeouts on PythonAnywhere
-    pool_recycle=280 if "mysql" in DATABASE_URL else -1
+    pool_recycle=280 if "mysql" in DATABASE_URL else -1,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    **pool_args
 )
+
+if "sqlite" in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _sqlite_connect(dbapi_connection, connection_record):
+        if SQLITE_TUNED:
+            cursor = dbapi_connection.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def begin_write_lock(db: Session):
+    """Make the session's transaction a writer before the reads a write depends on.
+
+    pysqlite only opens a transaction right before a write, so a
+    SELECT-then-INSERT is not atomic. On SQLite this sends BEGIN IMMEDIATE,
+    taking the database write lock up front; other backends lock rows with
+    SELECT ... FOR UPDATE instead. It is a no-op when the transaction is
+    already open, so nested callers (lock_barber) can ask again.
+
+    Only sessions that call this get an explicit BEGIN: everywhere else
+    pysqlite's implicit one stays. A deferred BEGIN on the first SELECT would
+    pin a WAL snapshot, and the session's later write would fail with
+    "database is locked" (SQLITE_BUSY_SNAPSHOT, busy_timeout does not apply)
+    whenever another writer commits in between.
+    """
+    conn = db.connection()
+    if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def release_connection(db: Session):
+    """Return the session's connection to the pool before slow non-DB work.
+
+    Async endpoints release it (through run_db) before awaiting password
+    hashing: otherwise a burst of them holds every pooled connection while
+    the next ones wait on checkout. Loaded objects keep their attribute values
+    and the session can keep being used (it checks out a new connection).
+    """
+    db.close()
+
+async def run_db(db: Session, fn, *args):
+    """Run fn(db, *args) from an async endpoint without blocking the event loop.
+
+    Session work blocks (pool checkout, busy_timeout, commits), so it runs in
+    the threadpool; the connection is released afterwards, ready for a slow
+    await such as password hashing.
+    """
+    def call():
+        try:
+            return fn(db, *args)
+        finally:
+            release_connection(db)
+    return await run_in_threadpool(call)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# =============== PER-REQUEST QUERY STATS ===============
+
+# Strict mode: flag a request that runs the same statement more than this many
+# times (the N+1 signature). 0 turns it off; the action is "log" or "raise".
+SQL_REPEAT_LIMIT = int(os.getenv("SQL_REPEAT_LIMIT", "0"))
+SQL_REPEAT_ACTION = os.getenv("SQL_REPEAT_ACTION", "log")
+
+logger = logging.getLogger("barbershop.sql")
+
+class RepeatedQueryError(RuntimeError):
+    """The same statement ran more than SQL_REPEAT_LIMIT times in one request"""
+
+class QueryStats:
+    """Statements and DB time accumulated while track_queries() is active"""
+
+    __slots__ = ("label", "count", "seconds", "shapes")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if not SQL_REPEAT_LIMIT:
+            return
+        # Bound parameters are placeholders, so the text is the statement's shape
+        runs = self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        if runs == SQL_REPEAT_LIMIT + 1:
+            message = f"{self.label}: same statement ran more than {SQL_REPEAT_LIMIT} times: {' '.join(statement.split())[:200]}"
+            if SQL_REPEAT_ACTION == "raise":
+                raise RepeatedQueryError(message)
+            logger.warning(message)
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@contextmanager
+def track_queries(label: str):
+    """Count statements and DB time run in this context (and threads it hands work to)"""
+    stats = QueryStats(label)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+# Threads that ran SQL for the request being profiled (see profiling.py)
+_watched_threads: ContextVar[Optional[Set[int]]] = ContextVar("watched_threads", default=None)
+
+# Thread ident -> watched set of the profiled request whose SQL that thread
+# ran last. The entry goes when the thread runs SQL for any other request, so
+# pooled threads stop counting for a profiled request once they serve another
+# one, and when the profiled request ends. Empty unless something is profiled.
+_thread_owners: Dict[int, Set[int]] = {}
+
+def thread_owner(ident: int) -> Optional[Set[int]]:
+    return _thread_owners.get(ident)
+
+@contextmanager
+def watch_threads(threads: Set[int]):
+    """Add to `threads` the ident of every thread that runs SQL in this context"""
+    token = _watched_threads.set(threads)
+    try:
+        yield threads
+    finally:
+        _watched_threads.reset(token)
+        for ident in list(threads):
+            if _thread_owners.get(ident) is threads:
+                _thread_owners.pop(ident, None)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+    threads = _watched_threads.get()
+    if threads is not None:
+        ident = threading.get_ident()
+        threads.add(ident)
+        _thread_owners[ident] = threads
+    elif _thread_owners:
+        _thread_owners.pop(threading.get_ident(), None)
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.pop("query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
@@ -0,0 +1,197 @@
+"""
+Bounded pool for password hashing and verification.
+
+bcrypt takes a few hundred milliseconds of CPU per call by design. Run inline
+in an async endpoint it freezes the event loop, and in a sync endpoint it ties
+up a threadpool worker that stories and availability requests are waiting for.
+Every bcrypt call goes through this pool instead: bcrypt releases the GIL, so
+HASH_WORKERS threads hash in parallel with the rest of the app, and at most
+HASH_MAX_PENDING calls may be queued or running. Beyond that the request is
+refused with 503 and Retry-After instead of queueing without bound.
+
+The bcrypt cost is BCRYPT_ROUNDS when set. Otherwise it is calibrated at
+startup: the highest cost in [BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS] whose
+verification fits in BCRYPT_TARGET_MS on this host. BCRYPT_ROUNDS_FILE only
+shares the result between the workers of one deployment, so timing noise
+cannot give them different costs: a worker reuses a cost saved on the same
+host less than BCRYPT_CALIBRATION_MAX_AGE seconds ago and calibrates again
+otherwise, so new hardware gets a new cost on the next restart. Stored hashes
+below the cost are re-hashed on the account's next successful login; a pinned
+BCRYPT_ROUNDS also moves hashes down (see needs_rehash).
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from fastapi import HTTPException
+from database import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers calibrate without waiting for each other
+    fcntl = None
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "32"))
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", "2"))
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0"))  # 0 = calibrate
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+BCRYPT_ROUNDS_FILE = os.getenv("BCRYPT_ROUNDS_FILE", os.path.join(DATA_DIR, "bcrypt_rounds"))
+BCRYPT_CALIBRATION_MAX_AGE = int(os.getenv("BCRYPT_CALIBRATION_MAX_AGE", "600"))
+
+logger = logging.getLogger("barbershop.hashing")
+
+
+class HashingPoolFull(HTTPException):
+    """503 returned when too many hashes are already queued"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Servidor ocupado. Tente novamente em instantes.",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)}
+        )
+
+
+class HashingPool:
+    """Thread pool with admission control: submit() fails fast when full"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.rejected = 0
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingPoolFull()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        """Call from sync code (threadpool endpoints, scripts)"""
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        """Call from async endpoints: waits without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_MAX_PENDING)
+
+
+# =============== WORK FACTOR ===============
+
+def time_bcrypt(rounds: int) -> float:
+    """Seconds for one bcrypt hash (or verify) at this cost"""
+    salt = bcrypt.gensalt(rounds=rounds)
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", salt)
+    return time.perf_counter() - started
+
+
+def calibrate_rounds(target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+    """Highest cost whose verify fits in target_seconds, never below min_rounds"""
+    # Each extra round doubles the work, so one measurement at the floor is enough
+    base = time_bcrypt(min_rounds)
+    rounds = min_rounds
+    while rounds < max_rounds and base * 2 ** (rounds + 1 - min_rounds) <= target_seconds:
+        rounds += 1
+    return rounds
+
+
+_rounds: Optional[int] = None
+_rounds_lock = threading.Lock()
+
+
+def _read_rounds(path: str) -> Optional[int]:
+    """A cost saved on this host within BCRYPT_CALIBRATION_MAX_AGE, else None"""
+    try:
+        with open(path) as f:
+            rounds, host = f.read().split()
+        age = time.time() - os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    if host != socket.gethostname() or age > BCRYPT_CALIBRATION_MAX_AGE:
+        return None
+    try:
+        return int(rounds)
+    except ValueError:
+        return None
+
+
+def _calibrated_rounds(path: str) -> int:
+    """The cost another worker just saved in `path`, else calibrate and save it"""
+    try:
+        lock = open(f"{path}.lock", "a")
+    except OSError:
+        lock = None
+    try:
+        # Workers starting together wait here for the first one's result
+        if lock is not None and fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        rounds = _read_rounds(path)
+        if rounds is not None:
+            return rounds
+        rounds = calibrate_rounds(BCRYPT_TARGET_MS / 1000, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS)
+        logger.info("bcrypt cost %d (target %.0f ms)", rounds, BCRYPT_TARGET_MS)
+        temporary = f"{path}.{os.getpid()}"
+        try:
+            with open(temporary, "w") as f:
+                f.write(f"{rounds} {socket.gethostname()}")
+            os.replace(temporary, path)
+        except OSError:
+            logger.warning("Could not save the bcrypt cost to %s", path)
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+        return rounds
+    finally:
+        if lock is not None:
+            lock.close()  # also releases the flock
+
+
+def bcrypt_rounds() -> int:
+    """The cost new hashes use (may calibrate: call it on the hashing pool, not the event loop)"""
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = BCRYPT_ROUNDS or _calibrated_rounds(BCRYPT_ROUNDS_FILE)
+    return _rounds
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost a stored bcrypt hash was made with ("$2b$12$..." -> 12)"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash should be redone at the current cost.
+
+    A calibrated cost only moves hashes up, so hosts that calibrated
+    differently never rewrite a hash back and forth; lowering the cost is an
+    explicit decision made by pinning BCRYPT_ROUNDS.
+    """
+    stored = hash_rounds(hashed_password)
+    if stored is None:
+        return False
+    current = bcrypt_rounds()
+    return stored != current if BCRYPT_ROUNDS else stored < current
@@ -0,0 +1,192 @@
+"""
+Request instrumentation, as plain ASGI middleware so it applies to every
+router without touching the endpoints.
+
+QueryTimingMiddleware counts the SQL statements and DB time of each request
+(see database.track_queries), reports them in a Server-Timing header, which
+browser dev tools show per request, and writes one JSON log line per request
+to the "barbershop.requests" logger.
+
+MetricsMiddleware keeps Prometheus counters and latency histograms per route
+template, served by GET /metrics. Updates happen on the event loop thread
+(plain dict/int operations, no locks) and series are keyed by the route
+template, never the raw path, so cardinality stays bounded.
+"""
+import json
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+from starlette.datastructures import MutableHeaders
+from database import engine, track_queries
+
+logger = logging.getLogger("barbershop.requests")
+
+
+class QueryTimingMiddleware:
+    """Server-Timing header and a structured log line with each request's DB totals"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        with track_queries(f"{scope['method']} {scope['path']}") as stats:
+            async def send_with_timing(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    total_ms = (time.perf_counter() - started) * 1000
+                    MutableHeaders(scope=message).append("Server-Timing", (
+                        f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", '
+                        f"total;dur={total_ms:.2f}"
+                    ))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(json.dumps({
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "db_queries": stats.count,
+                        "db_ms": round(stats.seconds * 1000, 2),
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+                    }))
+
+
+# =============== PROMETHEUS METRICS ===============
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[str, str, str]  # (method, route, status)
+
+
+class RequestMetrics:
+    """Request counters, latency histograms and in-flight/upload totals"""
+
+    def __init__(self):
+        self.in_flight = 0
+        # Per (method, route, status): bucket counts (non-cumulative, last one is +Inf), sum
+        self.latency: Dict[Labels, List] = {}
+        self.body_bytes: Dict[str, int] = {}  # route -> request body bytes received
+
+    def observe(self, labels: Labels, seconds: float, body_bytes: int):
+        series = self.latency.get(labels)
+        if series is None:
+            series = self.latency[labels] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        series[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series[1] += seconds
+        if body_bytes:
+            route = labels[1]
+            self.body_bytes[route] = self.body_bytes.get(route, 0) + body_bytes
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        lines = [
+            "# HELP http_requests_total Requests handled, by route template and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), (buckets, _) in sorted(self.latency.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {sum(buckets)}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route template and status.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), (buckets, total) in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += count
+                labels = _labels(method=method, route=route, status=status, le=str(bound))
+                lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels(method=method, route=route, status=status)
+            lines.append(f"http_request_duration_seconds_sum{labels} {total:.6f}")
+            lines.append(f"http_request_duration_seconds_count{labels} {cumulative}")
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_body_bytes_total Request body bytes received (uploads), by route template.",
+            "# TYPE http_request_body_bytes_total counter",
+        ]
+        for route, received in sorted(self.body_bytes.items()):
+            lines.append(f"http_request_body_bytes_total{_labels(route=route)} {received}")
+
+        lines += _pool_lines()
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _pool_lines() -> List[str]:
+    """Gauges from the SQLAlchemy connection pool (QueuePool exposes all of them)"""
+    pool = engine.pool
+    lines = []
+    for name, method, help_text in (
+        ("db_pool_size", "size", "Configured number of pooled connections."),
+        ("db_pool_checked_out", "checkedout", "Connections currently in use."),
+        ("db_pool_checked_in", "checkedin", "Idle connections in the pool."),
+        ("db_pool_overflow", "overflow", "Connections open beyond the pool size."),
+    ):
+        if hasattr(pool, method):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {getattr(pool, method)()}"]
+    return lines
+
+
+metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """Feed every HTTP request into `metrics`"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        body_bytes = 0
+
+        async def counting_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, counting_receive, send_with_status)
+        finally:
+            metrics.in_flight -= 1
+            # The router records the matched route in the scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            metrics.observe(
+                (scope["method"], route, str(status_code)), time.perf_counter() - started, body_bytes
+            )
@@ -1,16 +1,33 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from database import engine, Base
+from hashing import bcrypt_rounds, hashing_pool
+from instrumentation import MetricsMiddleware, QueryTimingMiddleware, metrics
+from profiling import ProfilerMiddleware
 from routers import admin, user, auth, customer, upload, stories
+import logging
 import models
 import os
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Barbershop API")
+# Logins resolve through the principals table: index accounts that predate it
+_, _principal_conflicts = models.index_missing_principals(engine)
+for _conflict in _principal_conflicts:
+    logging.getLogger("barbershop.auth").warning("%s; rename it before it can log in", _conflict)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Calibrate the bcrypt cost now rather than during the first login
+    await hashing_pool.run_async(bcrypt_rounds)
+    yield
+
+app = FastAPI(title="Barbershop API", lifespan=lifespan)
 
 # CORS - Configure via environment variable for production
 # Example: ALLOWED_ORIGINS=https://mybarbershop.com,https://admin.mybarbershop.com
@@ -22,8 +39,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Admin-flagged requests only (X-Profile header or ?profile=1)
+app.add_middleware(ProfilerMiddleware)
+
+# Outermost, so their timings cover the whole stack
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Optional bearer token for /metrics (unset = open, e.g. behind a private network)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Static Files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -38,6 +66,21 @@ app.include_router(customer.router)
 app.include_router(upload.router)
 app.include_router(stories.router)
 
+@app.exception_handler(user.SlotConflictError)
+async def slot_conflict_handler(request: Request, exc: user.SlotConflictError):
+    # Keep "detail" a string for old clients; alternatives go alongside it
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "alternatives": exc.alternatives}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return PlainTextResponse("Unauthorized", status_code=401)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -0,0 +1,200 @@
+"""
+Versioned schema migrations for existing SQLite and MySQL databases.
+
+New databases get the current schema from create_all() at startup; databases
+created by an older version need these steps. Applied versions are recorded in
+schema_migrations, and every step checks the live schema first, so running
+against a database that is already current is a no-op. Indexes are added
+online on MySQL (ALGORITHM=INPLACE, LOCK=NONE); SQLite builds them in place
+while holding the write lock for a moment.
+
+Usage:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+
+Replaces update_db.py (version 1) and migrate_price_snapshot.py (version 2).
+"""
+
+import argparse
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models
+import stats
+
+metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Register a migration step; versions must be applied in increasing order"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+# =============== SCHEMA HELPERS ===============
+
+def add_column(table: str, name: str, sql_type: str):
+    """ALTER TABLE ... ADD COLUMN unless the column exists"""
+    if name in {column["name"] for column in inspect(engine).get_columns(table)}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+    print(f"  Added {table}.{name}")
+
+
+def create_index(index: Index):
+    """Create a model-defined index unless one with that name exists"""
+    table = index.table.name
+    if index.name in {existing["name"] for existing in inspect(engine).get_indexes(table)}:
+        return
+    columns = ", ".join(column.name for column in index.columns)
+    with engine.begin() as conn:
+        if engine.dialect.name == "mysql":
+            # Online DDL: reads and writes continue while the index is built
+            kind = "UNIQUE INDEX" if index.unique else "INDEX"
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD {kind} {index.name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+            ))
+        else:
+            index.create(bind=conn)
+    print(f"  Created index {index.name} on {table} ({columns})")
+
+
+def model_index(model, name: str) -> Index:
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+# =============== MIGRATIONS ===============
+
+@migration(1, "Barber login and appointment feedback columns")
+def barber_login_columns():
+    add_column("barbers", "username", "VARCHAR(255)")
+    create_index(model_index(models.Barber, "ix_barbers_username"))
+    add_column("barbers", "hashed_password", "VARCHAR(255)")
+    add_column("appointments", "feedback_notes", "VARCHAR(255)")
+
+
+@migration(2, "Snapshot price, service name and duration on appointments")
+def price_snapshot():
+    add_column("appointments", "price_cents", "INTEGER")
+    add_column("appointments", "service_name", "VARCHAR(255)")
+    add_column("appointments", "duration_minutes", "INTEGER")
+
+    db: Session = SessionLocal()
+    try:
+        updated = 0
+        for barber_service in db.query(models.BarberService).all():
+            updated += db.query(models.Appointment).filter(
+                models.Appointment.barber_service_id == barber_service.id,
+                models.Appointment.service_name.is_(None)
+            ).update(stats.service_snapshot(barber_service=barber_service), synchronize_session=False)
+
+        # Legacy rows, and rows whose BarberService was deleted
+        for service in db.query(models.Service).all():
+            snapshot = stats.service_snapshot(service=service)
+            if snapshot["price_cents"] is None and service.price:
+                print(f"  Legacy price could not be parsed, left without a price: {service.name}: {service.price!r}")
+            updated += db.query(models.Appointment).filter(
+                models.Appointment.service_id == service.id,
+                models.Appointment.service_name.is_(None)
+            ).update(snapshot, synchronize_session=False)
+        db.commit()
+        print(f"  Backfilled {updated} appointments")
+    finally:
+        db.close()
+
+    # The rollup is derived data and now stores revenue in cents: recreate it
+    rollup_columns = {column["name"] for column in inspect(engine).get_columns("daily_barber_stats")}
+    if "revenue_cents" not in rollup_columns:
+        for model in (models.DailyBarberStat, models.DailyBarberServiceStat):
+            model.__table__.drop(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+    from rebuild_stats import rebuild_stats
+    rebuild_stats()
+
+
+@migration(3, "Indexes for the appointments hot queries and stories")
+def hot_query_indexes():
+    for name in (
+        "ix_appointments_barber_start_status",
+        "ix_appointments_start_time",
+        "ix_appointments_customer_start",
+    ):
+        create_index(model_index(models.Appointment, name))
+    create_index(model_index(models.AppointmentMedia, "ix_appointment_media_created_at"))
+
+
+@migration(4, "login_attempts becomes an audit log with expiry")
+def login_attempts_audit():
+    create_index(model_index(models.LoginAttempt, "ix_login_attempts_last_attempt"))
+    # Old rows are per-identifier limiter state, not audit entries
+    with engine.begin() as conn:
+        deleted = conn.execute(models.LoginAttempt.__table__.delete()).rowcount
+    print(f"  Removed {deleted} rate limiter rows")
+
+
+@migration(5, "principals: one login index across users and barbers")
+def principal_index():
+    # main.py also does this at startup; kept so migrate.py reports conflicts
+    added, conflicts = models.index_missing_principals(engine)
+    for conflict in conflicts:
+        print(f"  {conflict}, rename it before it can log in")
+    print(f"  Indexed {added} logins")
+
+
+# =============== RUNNER ===============
+
+def applied_versions() -> dict:
+    metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return {row.version: row.applied_at for row in conn.execute(select(schema_migrations))}
+
+
+def migrate():
+    """Apply pending migrations in order, recording each one as it completes"""
+    # Tables added since the database was created (no-op for existing ones)
+    models.Base.metadata.create_all(bind=engine)
+    applied = applied_versions()
+
+    pending = [m for m in sorted(MIGRATIONS, key=lambda m: m[0]) if m[0] not in applied]
+    if not pending:
+        print("Database is up to date")
+        return
+    for version, description, fn in pending:
+        print(f"Applying {version}: {description}")
+        fn()
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+    print(f"\nApplied {len(pending)} migration(s)")
+
+
+def show_status():
+    applied = applied_versions()
+    for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        state = f"applied {applied[version].isoformat()}" if version in applied else "pending"
+        print(f"{version:>4}  {state:<35}  {description}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}\n")
+    if args.status:
+        show_status()
+    else:
+        migrate()
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, Boolean, Float, Index, UniqueConstraint, event, inspect, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -13,14 +14,14 @@ class User(Base):
     avatar_url = Column(String, nullable=True)
 
 class LoginAttempt(Base):
-    """Track login attempts for rate limiting"""
+    """Audit log of failed logins, one row each (only written with LOGIN_AUDIT on)"""
     __tablename__ = "login_attempts"
     
     id = Column(Integer, primary_key=True, index=True)
-    identifier = Column(String, index=True, nullable=False)  # IP or username
-    attempts = Column(Integer, default=0)
+    identifier = Column(String, index=True, nullable=False)  # IP:username
+    attempts = Column(Integer, default=0)  # failures in the limiter's window so far
     locked_until = Column(DateTime, nullable=True)
-    last_attempt = Column(DateTime, default=datetime.utcnow)
+    last_attempt = Column(DateTime, default=datetime.utcnow, index=True)  # when it failed
 
 class Barber(Base):
     __tablename__ = "barbers"
@@ -79,6 +80,15 @@ class Customer(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Availability/booking (barber + start range, status and end_time read from the
+        # index), panel listing and dashboard per barber
+        Index("ix_appointments_barber_start_status", "barber_id", "start_time", "status", "end_time"),
+        # Panel listing and dashboard across all barbers
+        Index("ix_appointments_start_time", "start_time"),
+        # Customer history
+        Index("ix_appointments_customer_start", "customer_id", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_name = Column(String, index=True)
@@ -91,6 +101,10 @@ class Appointment(Base):
     end_time = Column(DateTime)
     status = Column(String, default="scheduled")  # scheduled, completed, no_show
     feedback_notes = Column(String, nullable=True)
+    # Snapshot of the service when booked, so price edits don't rewrite history
+    price_cents = Column(Integer, nullable=True)  # None when the legacy price is unparseable
+    service_name = Column(String, nullable=True)
+    duration_minutes = Column(Integer, nullable=True)
     
     customer = relationship("Customer", back_populates="appointments")
     barber = relationship("Barber", back_populates="appointments")
@@ -106,6 +120,102 @@ class AppointmentMedia(Base):
     appointment_id = Column(Integer, ForeignKey("appointments.id", ondelete="CASCADE"), nullable=False)
     media_url = Column(String, nullable=False)
     media_type = Column(String, default="image")  # image or video
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     appointment = relationship("Appointment", back_populates="media")
+
+class DailyBarberStat(Base):
+    """Daily rollup of appointments per barber (barber_id 0 = no barber)"""
+    __tablename__ = "daily_barber_stats"
+    __table_args__ = (UniqueConstraint("barber_id", "day", name="uq_daily_barber_stats"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    barber_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    active_count = Column(Integer, default=0, nullable=False)
+    cancelled_count = Column(Integer, default=0, nullable=False)  # cancelled + no_show
+    revenue_cents = Column(Integer, default=0, nullable=False)
+
+class DailyBarberServiceStat(Base):
+    """Daily count of active appointments per barber and service name"""
+    __tablename__ = "daily_barber_service_stats"
+    __table_args__ = (UniqueConstraint("barber_id", "day", "service_name", name="uq_daily_barber_service_stats"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    barber_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    service_name = Column(String, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+class PrincipalIndex(Base):
+    """Every login name, Admin or Barber, so login resolves an account in one lookup"""
+    __tablename__ = "principals"
+    __table_args__ = (UniqueConstraint("role", "account_id", name="uq_principals_account"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)  # unique across both tables
+    role = Column(String, nullable=False)  # "admin" (users.id) or "barber" (barbers.id)
+    account_id = Column(Integer, nullable=False)
+
+# Kept in step with users/barbers by mapper events, so every ORM write
+# (endpoints and scripts alike) maintains it; a duplicate username fails the flush
+PRINCIPAL_ROLES = {User: "admin", Barber: "barber"}
+
+def _index_principal(mapper, connection, target):
+    principals = PrincipalIndex.__table__
+    role = PRINCIPAL_ROLES[mapper.class_]
+    connection.execute(principals.delete().where(
+        principals.c.role == role, principals.c.account_id == target.id
+    ))
+    if target.username:
+        connection.execute(principals.insert().values(
+            username=target.username, role=role, account_id=target.id
+        ))
+
+def _reindex_principal(mapper, connection, target):
+    if inspect(target).attrs.username.history.has_changes():
+        _index_principal(mapper, connection, target)
+
+def _unindex_principal(mapper, connection, target):
+    principals = PrincipalIndex.__table__
+    connection.execute(principals.delete().where(
+        principals.c.role == PRINCIPAL_ROLES[mapper.class_], principals.c.account_id == target.id
+    ))
+
+for _model in PRINCIPAL_ROLES:
+    event.listen(_model, "after_insert", _index_principal)
+    event.listen(_model, "after_update", _reindex_principal)
+    event.listen(_model, "after_delete", _unindex_principal)
+
+def index_missing_principals(engine):
+    """Index accounts that have no principals row (created before the index, or by raw SQL).
+
+    Runs at every startup, so logins work without running migrate.py first.
+    Admins go first, as login used to try users before barbers. Returns the
+    number of rows added and the accounts left out because another login
+    already uses their username.
+    """
+    principals = PrincipalIndex.__table__
+    with engine.connect() as conn:
+        indexed = {(row.role, row.account_id) for row in conn.execute(select(principals.c.role, principals.c.account_id))}
+        taken = {row.username: row.role for row in conn.execute(select(principals.c.username, principals.c.role))}
+        missing = []
+        for model, role in PRINCIPAL_ROLES.items():
+            table = model.__table__
+            rows = conn.execute(select(table.c.id, table.c.username).where(table.c.username.isnot(None)))
+            missing.extend((role, account_id, username) for account_id, username in rows if (role, account_id) not in indexed)
+    added, conflicts = 0, []
+    for role, account_id, username in missing:
+        if username in taken:
+            conflicts.append(f"{role} {account_id}: username {username!r} is taken by the {taken[username]} login")
+            continue
+        try:
+            # One transaction per row: a worker starting at the same time may insert it first
+            with engine.begin() as conn:
+                conn.execute(principals.insert().values(username=username, role=role, account_id=account_id))
+            added += 1
+        except IntegrityError:
+            pass
+        taken[username] = role
+    return added, conflicts
+
@@ -0,0 +1,106 @@
+"""
+Minute-resolution occupancy bitmaps.
+
+A barber's day is a Python int where bit N set means minute N after midnight
+is busy (1440 bits for a normal day; intervals that run past midnight simply
+use higher bits). "Is [t, t + d) free?" for every t at once is a sliding-window
+OR computed with O(log d) shifts, so slot generation and conflict checks do
+not loop over appointments.
+"""
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+ONE_MINUTE = timedelta(minutes=1)
+
+
+def _span(minutes: int) -> int:
+    """Bitmask with the lowest `minutes` bits set"""
+    return (1 << minutes) - 1 if minutes > 0 else 0
+
+
+class DayOccupancy:
+    """Busy minutes of one day as a bitmap"""
+
+    __slots__ = ("day", "day_start", "bits")
+
+    def __init__(self, day: date, bits: int = 0):
+        self.day = day
+        self.day_start = datetime.combine(day, datetime.min.time())
+        self.bits = bits
+
+    @classmethod
+    def from_intervals(cls, day: date, intervals: Iterable[Tuple[datetime, datetime]]) -> "DayOccupancy":
+        occupancy = cls(day)
+        for start, end in intervals:
+            occupancy.mark(start, end)
+        return occupancy
+
+    def minute_of(self, moment: datetime) -> int:
+        """Minutes since the start of this day (negative before it)"""
+        return (moment - self.day_start) // ONE_MINUTE
+
+    def mark(self, start: datetime, end: datetime):
+        """Set [start, end) as busy; partial minutes count as busy"""
+        first = max((start - self.day_start) // ONE_MINUTE, 0)
+        last = -((self.day_start - end) // ONE_MINUTE)  # ceil to the next minute
+        if last > first:
+            self.bits |= _span(last - first) << first
+
+    def window_blocked(self, duration_minutes: int) -> int:
+        """Bit t set when any minute in [t, t + duration) is busy"""
+        blocked = self.bits
+        width = 1
+        # Doubling: after each step, bit t covers [t, t + width)
+        while width * 2 <= duration_minutes:
+            blocked |= blocked >> width
+            width *= 2
+        if width < duration_minutes:
+            blocked |= blocked >> (duration_minutes - width)
+        return blocked
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """True when no busy minute overlaps [start, end)"""
+        probe = DayOccupancy(self.day)
+        probe.mark(start, end)
+        return not (self.bits & probe.bits)
+
+    def free_minutes(
+        self,
+        duration_minutes: int,
+        first_minute: int,
+        last_end_minute: int,
+        step_minutes: int
+    ) -> List[int]:
+        """Free start minutes every `step_minutes` from first_minute whose window ends by last_end_minute"""
+        last = last_end_minute - duration_minutes
+        if last < first_minute:
+            return []
+        candidates = 0
+        for minute in range(first_minute, last + 1, step_minutes):
+            candidates |= 1 << minute
+        free = candidates & ~self.window_blocked(duration_minutes)
+
+        minutes = []
+        while free:
+            lowest = free & -free
+            minutes.append(lowest.bit_length() - 1)
+            free ^= lowest
+        return minutes
+
+    def free_starts(
+        self,
+        duration_minutes: int,
+        first_start: datetime,
+        last_end: datetime,
+        step_minutes: int
+    ) -> Iterator[datetime]:
+        """Same as free_minutes, as datetimes"""
+        for minute in self.free_minutes(
+            duration_minutes, self.minute_of(first_start), self.minute_of(last_end), step_minutes
+        ):
+            yield self.day_start + timedelta(minutes=minute)
+
+
+def format_minute(minute: int) -> str:
+    """Minute of the day formatted as HH:MM"""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
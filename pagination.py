@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination for appointment listings.
+
+Pages are ordered by (start_time, id) and a cursor is the opaque encoding of
+the last row's key, so fetching page N costs the same index range scan as
+page 1 instead of skipping N * limit rows. The next page's cursor is sent in
+the X-Next-Cursor response header, keeping the list body unchanged for
+existing clients; the header is absent on the last page.
+"""
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+import models
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(start_time: datetime, appointment_id: int) -> str:
+    raw = f"{start_time.isoformat()}|{appointment_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(start_time, id) from a cursor; 400 when it was not produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, appointment_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(appointment_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+def paginate_appointments(
+    query: Query,
+    response: Response,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+    skip: int = 0
+) -> List[models.Appointment]:
+    """One page of appointments after `cursor`, setting X-Next-Cursor when more remain.
+
+    `skip` keeps old offset-based clients working and is ignored with a cursor.
+    """
+    start_col, id_col = models.Appointment.start_time, models.Appointment.id
+    if cursor:
+        start_time, appointment_id = decode_cursor(cursor)
+        # Written as a range on start_time plus a tie-break so it stays an index range scan
+        if descending:
+            query = query.filter(start_col <= start_time, or_(
+                start_col < start_time, and_(start_col == start_time, id_col < appointment_id)
+            ))
+        else:
+            query = query.filter(start_col >= start_time, or_(
+                start_col > start_time, and_(start_col == start_time, id_col > appointment_id)
+            ))
+    if descending:
+        query = query.order_by(start_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(start_col.asc(), id_col.asc())
+
+    if skip and not cursor:
+        query = query.offset(skip)
+
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:  # limit=0: an empty page has no key to continue from
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].start_time, rows[-1].id)
+    return rows
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
+import stats
 
 # Ensure tables exist
 models.Base.metadata.create_all(bind=engine)
@@ -74,12 +75,15 @@ def create_random_appointments(db: Session, services):
                 customer_phone=customer[1],
                 service_id=service.id,
                 start_time=app_start,
-                end_time=app_end
+                end_time=app_end,
+                **stats.service_snapshot(service=service)
             )
             db.add(appointment)
             total_created += 1
             
     db.commit()
+    # The dashboard reads past days from the rollup
+    stats.rebuild(db, start_date, today)
     print(f"Total appointments created: {total_created}")
 
 def main():
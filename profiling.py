@@ -0,0 +1,221 @@
+"""
+Opt-in profiling of single requests, for admins chasing a slow call in
+production.
+
+Add the header "X-Profile: 1" or the query flag "?profile=1" to a request made
+with an admin token (Authorization header or the panel's access_token cookie)
+and it runs under a wall-clock stack sampler. The samples are written to
+PROFILE_DIR in the folded-stack format ("frame;frame;frame count" per line),
+which flamegraph.pl and speedscope.app read directly; only the newest
+PROFILE_MAX_FILES are kept. The response carries the file name in
+X-Profile-Id; GET /panel/profiles lists the captures.
+
+Endpoints are sync and run in the threadpool, so the sampler follows the event
+loop thread plus every thread that runs SQL for the request (picked up at its
+first statement, see database.watch_threads). Other requests share those
+threads, so a sample only counts when it belongs to this request: on the event
+loop, when the request's own coroutine is on the stack; on a worker thread,
+while the last SQL it ran was this request's. Work a pooled thread does for
+another request before its first statement can still be attributed here.
+Requests without the flag only pay for the flag check; a flag from a
+non-admin is ignored.
+"""
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Set
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from database import SessionLocal, thread_owner, watch_threads
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "barbershop-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "2")) / 1000
+PROFILE_HEADER = b"x-profile"
+PROFILE_HEADER_VALUES = {b"1", b"true", b"yes"}
+PROFILE_QUERY_FLAG = re.compile(rb"(^|&)profile=(1|true)(&|$)")
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SUFFIX = ".folded"
+
+# Leaf frames of a thread that is waiting rather than working
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+logger = logging.getLogger("barbershop.profiling")
+
+
+class StackSampler(threading.Thread):
+    """Counts the folded stacks of one request's threads every `interval` seconds"""
+
+    def __init__(self, threads: Set[int], interval: float, loop_thread: int, request_frame):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.threads = threads
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.request_frame = request_frame
+        self.samples: Counter = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None and not _is_idle(frame) and self._is_ours(ident, frame):
+                    self.samples[_fold(frame)] += 1
+
+    def _is_ours(self, ident: int, frame) -> bool:
+        if ident == self.loop_thread:
+            return _on_stack(frame, self.request_frame)
+        return thread_owner(ident) is self.threads
+
+    def stop(self) -> Counter:
+        self.done.set()
+        self.join()
+        return self.samples
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _on_stack(frame, target) -> bool:
+    while frame is not None:
+        if frame is target:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _fold(frame) -> str:
+    """Root-first "module.function;..." for one stack"""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_QUERY_FLAG.search(scope.get("query_string", b"")):
+        return True
+    return any(
+        name == PROFILE_HEADER and value.strip().lower() in PROFILE_HEADER_VALUES
+        for name, value in scope["headers"]
+    )
+
+
+def _is_admin(scope) -> bool:
+    """Same check as the panel's admin endpoints, on the request's own token"""
+    from routers.auth import get_current_admin_user, get_current_user
+
+    request = Request(scope)
+    credentials = request.headers.get("authorization") or request.cookies.get("access_token") or ""
+    scheme, _, token = credentials.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    db = SessionLocal()
+    try:
+        get_current_admin_user(get_current_user(token, db))
+        return True
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+def _profile_name(scope) -> str:
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+    return f"{stamp}_{scope['method']}_{path[:80]}{PROFILE_SUFFIX}"
+
+
+def _save(name: str, samples: Counter):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    # Names start with a timestamp: drop the oldest beyond the limit
+    for old in list_profiles()[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old["name"]))
+        except OSError:
+            pass
+
+
+class ProfilerMiddleware:
+    """Profile requests flagged by an admin; everything else passes straight through"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not await run_in_threadpool(_is_admin, scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = _profile_name(scope)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, name)
+            await send(message)
+
+        # The event loop thread, plus worker threads as they run SQL
+        loop_thread = threading.get_ident()
+        threads = {loop_thread}
+        sampler = StackSampler(threads, PROFILE_INTERVAL, loop_thread, sys._getframe())
+        started = time.perf_counter()
+        with watch_threads(threads):
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                samples = sampler.stop()
+                await run_in_threadpool(_save, name, samples)
+                logger.info(
+                    "Profiled %s %s in %.1f ms (%d samples): %s", scope["method"], scope["path"],
+                    (time.perf_counter() - started) * 1000, sum(samples.values()), name
+                )
+
+
+# =============== CAPTURED PROFILES ===============
+
+def list_profiles() -> List[Dict]:
+    """Captured profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+            info = entry.stat()
+            profiles.append({
+                "name": entry.name,
+                "size_bytes": info.st_size,
+                "created_at": datetime.fromtimestamp(info.st_mtime),
+            })
+    profiles.sort(key=lambda p: p["name"], reverse=True)
+    return profiles
+
+
+def profile_path(name: str) -> str:
+    """Path of a captured profile; 404 for anything that is not one"""
+    path = os.path.join(PROFILE_DIR, name)
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return path
@@ -0,0 +1,190 @@
+"""
+Login rate limiting without database writes.
+
+Failures are counted per identifier (client IP plus username). After the n-th
+failure the identifier is locked for delays[n] seconds (RATE_LIMIT_DELAYS in
+routers/auth.py), and a successful login clears it. A failure more than
+`window` seconds after the previous one starts the count again, so an
+identifier that goes quiet is forgotten instead of being kept forever.
+
+Backends (LOGIN_LIMITER_BACKEND):
+    memory  per process; the default, and exact with a single worker. Beyond
+            LOGIN_LIMITER_MAX_ENTRIES identifiers the oldest unlocked one is
+            evicted; active lockouts never are
+    sqlite  a small SQLite file (LOGIN_LIMITER_PATH) shared by every worker
+            process on the host, kept apart from the application database so
+            an attack never contends for its write lock
+
+Another shared store (e.g. Redis) plugs in by subclassing LoginLimiter.
+"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Optional, Tuple
+from database import DATA_DIR
+
+LOGIN_LIMITER_BACKEND = os.getenv("LOGIN_LIMITER_BACKEND", "memory")
+LOGIN_LIMITER_PATH = os.getenv("LOGIN_LIMITER_PATH", os.path.join(DATA_DIR, "login_limiter.db"))
+LOGIN_ATTEMPT_WINDOW_SECONDS = int(os.getenv("LOGIN_ATTEMPT_WINDOW_SECONDS", "900"))
+LOGIN_LIMITER_MAX_ENTRIES = int(os.getenv("LOGIN_LIMITER_MAX_ENTRIES", "100000"))
+PRUNE_INTERVAL_SECONDS = 60
+EVICTION_SCAN = 64  # oldest entries looked at for an unlocked one to evict
+
+
+class LoginLimiter(ABC):
+    """Escalating lockouts per identifier; subclasses store the counters"""
+
+    def __init__(self, delays: List[int], window: int):
+        self.delays = delays
+        self.window = window
+
+    def delay_for(self, attempts: int) -> int:
+        """Lockout in seconds after the attempts-th failure"""
+        return self.delays[min(attempts, len(self.delays) - 1)]
+
+    @abstractmethod
+    def check(self, identifier: str) -> Optional[int]:
+        """Seconds to wait before trying again, or None if allowed"""
+
+    @abstractmethod
+    def record_failure(self, identifier: str) -> Tuple[int, int]:
+        """Count a failed login; returns (failures in the window, lockout seconds)"""
+
+    @abstractmethod
+    def clear(self, identifier: str):
+        """Forget an identifier after a successful login"""
+
+
+def _wait(locked_until: float, now: float) -> Optional[int]:
+    return int(locked_until - now) + 1 if locked_until > now else None
+
+
+class MemoryLoginLimiter(LoginLimiter):
+    """Per-process counters, oldest unlocked identifiers evicted beyond max_entries"""
+
+    def __init__(self, delays: List[int], window: int, max_entries: int):
+        super().__init__(delays, window)
+        self.max_entries = max_entries
+        # identifier -> (failures, locked_until, last_failure), least recent first
+        self._entries: "OrderedDict[str, Tuple[int, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+
+    def check(self, identifier: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(identifier)
+        return _wait(entry[1], time.time()) if entry else None
+
+    def record_failure(self, identifier: str) -> Tuple[int, int]:
+        now = time.time()
+        with self._lock:
+            attempts, _, last_failure = self._entries.pop(identifier, (0, 0.0, now))
+            if now - last_failure > self.window:
+                attempts = 0
+            attempts += 1
+            delay = self.delay_for(attempts)
+            self._entries[identifier] = (attempts, now + delay, now)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+            elif now - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                self._prune(now)
+        return attempts, delay
+
+    def clear(self, identifier: str):
+        with self._lock:
+            self._entries.pop(identifier, None)
+
+    def _prune(self, now: float):
+        # Ordered by last failure, so expired entries are at the front
+        while self._entries:
+            identifier, (_, locked_until, last_failure) = next(iter(self._entries.items()))
+            if now - last_failure <= self.window or locked_until > now:
+                break
+            del self._entries[identifier]
+        self._last_prune = now
+
+    def _evict(self, now: float):
+        """Make room for one entry without dropping an active lockout"""
+        self._prune(now)
+        if len(self._entries) <= self.max_entries:
+            return
+        # Only the front is scanned, so a flood of lockouts can keep the size
+        # above max_entries until they expire
+        for identifier, (_, locked_until, _) in islice(self._entries.items(), EVICTION_SCAN):
+            if locked_until <= now:
+                del self._entries[identifier]
+                return
+
+
+class SQLiteLoginLimiter(LoginLimiter):
+    """Counters in a SQLite file shared by the worker processes of one host"""
+
+    def __init__(self, path: str, delays: List[int], window: int):
+        super().__init__(delays, window)
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0.0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS login_limits ("
+            "identifier TEXT PRIMARY KEY, attempts INTEGER NOT NULL, "
+            "locked_until REAL NOT NULL, last_failure REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, in autocommit mode"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def check(self, identifier: str) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT locked_until FROM login_limits WHERE identifier = ?", (identifier,)
+        ).fetchone()
+        return _wait(row[0], time.time()) if row else None
+
+    def record_failure(self, identifier: str) -> Tuple[int, int]:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT attempts, last_failure FROM login_limits WHERE identifier = ?", (identifier,)
+            ).fetchone()
+            attempts = row[0] if row and now - row[1] <= self.window else 0
+            attempts += 1
+            delay = self.delay_for(attempts)
+            conn.execute(
+                "INSERT OR REPLACE INTO login_limits (identifier, attempts, locked_until, last_failure) "
+                "VALUES (?, ?, ?, ?)", (identifier, attempts, now + delay, now)
+            )
+            if now - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                conn.execute(
+                    "DELETE FROM login_limits WHERE last_failure < ? AND locked_until < ?",
+                    (now - self.window, now)
+                )
+                self._last_prune = now
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return attempts, delay
+
+    def clear(self, identifier: str):
+        self._connection().execute("DELETE FROM login_limits WHERE identifier = ?", (identifier,))
+
+
+def create_limiter(delays: List[int]) -> LoginLimiter:
+    """The limiter selected by LOGIN_LIMITER_BACKEND"""
+    if LOGIN_LIMITER_BACKEND == "memory":
+        return MemoryLoginLimiter(delays, LOGIN_ATTEMPT_WINDOW_SECONDS, LOGIN_LIMITER_MAX_ENTRIES)
+    if LOGIN_LIMITER_BACKEND == "sqlite":
+        return SQLiteLoginLimiter(LOGIN_LIMITER_PATH, delays, LOGIN_ATTEMPT_WINDOW_SECONDS)
+    raise ValueError(f"Unknown LOGIN_LIMITER_BACKEND: {LOGIN_LIMITER_BACKEND!r}")
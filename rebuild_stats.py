@@ -0,0 +1,59 @@
+"""
+Rebuild the daily dashboard rollups (daily_barber_stats) from appointments.
+Run once after deploying the rollup tables to backfill history, and again
+whenever the rollup may have drifted (e.g. after editing appointments by hand).
+
+Usage:
+    python rebuild_stats.py                      # every day with appointments
+    python rebuild_stats.py --start 2024-01-01 --end 2024-01-31
+
+Run it off-peak: bookings made while a day is being rebuilt can be counted
+twice or not at all for that day.
+"""
+
+import argparse
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models
+import stats
+
+
+def parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def rebuild_stats(start_day=None, end_day=None):
+    """Recompute the rollup for [start_day, end_day], defaulting to all appointments"""
+    models.Base.metadata.create_all(bind=engine)
+    db: Session = SessionLocal()
+
+    try:
+        first, last = db.query(
+            func.min(models.Appointment.start_time), func.max(models.Appointment.start_time)
+        ).one()
+        if start_day is None:
+            start_day = first.date() if first else date.today()
+        if end_day is None:
+            end_day = last.date() if last else date.today()
+
+        written = stats.rebuild(db, start_day, end_day)
+
+        print(f"\n=== Rebuild Summary ===")
+        print(f"Range: {start_day.isoformat()} to {end_day.isoformat()}")
+        print(f"Wrote {written} barber-day rows")
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=parse_day, default=None, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_day, default=None, help="Last day (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    print(f"Starting stats rebuild at {datetime.now().isoformat()}")
+    rebuild_stats(args.start, args.end)
+    print(f"\nRebuild completed at {datetime.now().isoformat()}")
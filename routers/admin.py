@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import func, desc
 from typing import List, Dict, Any, Optional
 from datetime import date, timedelta, datetime
 import models, schemas
 from database import get_db
-from routers.auth import get_current_admin_user, get_current_panel_user, get_password_hash
+from pagination import paginate_appointments
+import availability
+import profiling
+import stats as stats_rollup
+from routers.auth import get_current_admin_user, get_current_panel_user, get_password_hash, principal_cache, username_taken
 
 router = APIRouter(
     prefix="/panel",
@@ -17,11 +22,13 @@ router = APIRouter(
 @router.get("/barbers", response_model=List[schemas.Barber])
 def list_barbers(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
     """List all barbers with their services"""
-    return db.query(models.Barber).all()
+    return db.query(models.Barber).options(selectinload(models.Barber.services)).all()
 
 @router.post("/barbers", response_model=schemas.Barber)
 def create_barber(barber: schemas.BarberCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
     """Create a new barber"""
+    if barber.username and username_taken(db, barber.username):
+        raise HTTPException(status_code=400, detail="Nome de usuário já existe")
     db_barber = models.Barber(**barber.model_dump(exclude={'password'}))
     if barber.password:
         db_barber.hashed_password = get_password_hash(barber.password)
@@ -55,6 +62,8 @@ def update_barber(barber_id: int, barber_update: schemas.BarberUpdate, db: Sessi
         raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
     
     update_data = barber_update.model_dump(exclude_unset=True)
+    if update_data.get('username') and username_taken(db, update_data['username'], "barber", barber_id):
+        raise HTTPException(status_code=400, detail="Nome de usuário já existe")
     if 'password' in update_data and update_data['password']:
         update_data['hashed_password'] = get_password_hash(update_data['password'])
         del update_data['password']
@@ -64,6 +73,9 @@ def update_barber(barber_id: int, barber_update: schemas.BarberUpdate, db: Sessi
     
     db.commit()
     db.refresh(db_barber)
+    availability.invalidate_barber(db_barber.id)
+    # Username or state may have changed: resolve this barber's tokens again
+    principal_cache.invalidate("barber", db_barber.id)
     return db_barber
 
 @router.put("/admin/me")
@@ -78,10 +90,8 @@ def update_admin_me(
         raise HTTPException(status_code=404, detail="User not found")
         
     if user_update.username:
-        if user_update.username != user.username:
-            existing = db.query(models.User).filter(models.User.username == user_update.username).first()
-            if existing:
-                raise HTTPException(status_code=400, detail="Nome de usuário já existe")
+        if username_taken(db, user_update.username, "admin", user.id):
+            raise HTTPException(status_code=400, detail="Nome de usuário já existe")
         user.username = user_update.username
         
     if user_update.password:
@@ -89,6 +99,7 @@ def update_admin_me(
         
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate("admin", user.id)
     return {"message": "Admin updated successfully"}
 
 @router.delete("/barbers/{barber_id}")
@@ -99,6 +110,7 @@ def delete_barber(barber_id: int, db: Session = Depends(get_db), current_user: m
         raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
     db.delete(db_barber)
     db.commit()
+    principal_cache.invalidate("barber", barber_id)
     return {"ok": True}
 
 # =============== BARBER SERVICES CRUD ===============
@@ -190,15 +202,22 @@ def delete_service(service_id: int, db: Session = Depends(get_db), current_user:
 
 @router.get("/appointments", response_model=List[schemas.Appointment])
 def read_appointments(
+    response: Response,
     date_filter: Optional[str] = None,  # YYYY-MM-DD
     barber_id: Optional[int] = None,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,  # X-Next-Cursor from the previous page
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_panel_user)
 ):
-    """Get appointments with optional date and barber filters"""
-    query = db.query(models.Appointment)
+    """Get appointments with optional date and barber filters, paged by cursor"""
+    # Everything schemas.Appointment serializes, loaded with the page
+    query = db.query(models.Appointment).options(
+        joinedload(models.Appointment.barber),
+        joinedload(models.Appointment.barber_service),
+        joinedload(models.Appointment.service)
+    )
     
     # If user is a barber, force filter
     if getattr(current_user, "role", "admin") == "barber":
@@ -223,7 +242,7 @@ def read_appointments(
         query = query.filter(models.Appointment.barber_id == barber_id)
     
     # Order by start_time ascending (earliest first)
-    return query.order_by(models.Appointment.start_time.asc()).offset(skip).limit(limit).all()
+    return paginate_appointments(query, response, limit, cursor, skip=skip)
 
 # =============== DASHBOARD STATS ===============
 
@@ -259,17 +278,9 @@ def get_dashboard_stats(
     else:
         end_dt = today
     
-    # Build query
-    query = db.query(models.Appointment).filter(
-        models.Appointment.start_time >= datetime.combine(start_dt, datetime.min.time()),
-        models.Appointment.start_time <= datetime.combine(end_dt, datetime.max.time())
-    )
-    
-    # Filter by barber if specified
-    if barber_id:
-        query = query.filter(models.Appointment.barber_id == barber_id)
-    
-    appointments = query.all()
+    # Closed days come from the rollup; today onwards is still changing
+    days = stats_rollup.read_rollup(db, start_dt, min(end_dt, today - timedelta(days=1)), barber_id)
+    days.update(stats_rollup.aggregate(db, max(start_dt, today), end_dt, barber_id))
     
     # Calculate number of days in range
     num_days = (end_dt - start_dt).days + 1
@@ -278,80 +289,56 @@ def get_dashboard_stats(
         "labels": [],
         "appointments_data": [],
         "revenue_data": [],
+        "cancelled_data": [],
         "service_distribution": {"labels": [], "data": []},
         "total_revenue": 0.0,
         "count_today": 0,
         "barber_count": db.query(models.Barber).filter(models.Barber.is_active == True).count(),
-        "total_appointments": len(appointments),
+        "total_appointments": 0,
         "start_date": start_dt.isoformat(),
         "end_date": end_dt.isoformat()
     }
     
+    # Sum the per-barber rows into one entry per day
     daily_stats = {}
-    for i in range(num_days):
-        d = start_dt + timedelta(days=i)
-        d_str = d.strftime("%d/%m")
-        stats["labels"].append(d_str)
-        stats["appointments_data"].append(0)  # Make sure list is init with 0
-        stats["revenue_data"].append(0.0)
-        # New: Cancelled data
-        daily_stats[d_str] = {"active": 0, "cancelled": 0, "revenue": 0.0}
-
     service_counts = {}
-
-    for app in appointments:
-        app_date_str = app.start_time.strftime("%d/%m")
-        
-        if app.start_time.date() == today:
+    total_revenue_cents = 0
+    for (_, day), data in days.items():
+        totals = daily_stats.setdefault(day, {"active": 0, "cancelled": 0, "revenue_cents": 0})
+        totals["active"] += data["active"]
+        totals["cancelled"] += data["cancelled"]
+        totals["revenue_cents"] += data["revenue_cents"]
+        stats["total_appointments"] += data["active"] + data["cancelled"]
+        total_revenue_cents += data["revenue_cents"]
+        if day == today:
             # Only count active for "Today's Appointments" count
-            if app.status in ['scheduled', 'completed']:
-                stats["count_today"] += 1
-            
-        if app_date_str in daily_stats:
-            # Check status
-            if app.status in ['cancelled', 'no_show']:
-                daily_stats[app_date_str]["cancelled"] += 1
-            else:
-                daily_stats[app_date_str]["active"] += 1
-                
-                # Calculate revenue (only for active)
-                price = 0.0
-                s_name = None
-                if app.barber_service:
-                    price = app.barber_service.discount_price or app.barber_service.price
-                    s_name = app.barber_service.name
-                elif app.service and app.service.price:
-                    try:
-                        price_str = app.service.price.replace("R$", "").replace(" ", "").replace(",", ".")
-                        price = float(price_str)
-                        s_name = app.service.name
-                    except ValueError:
-                        pass
-                
-                daily_stats[app_date_str]["revenue"] += price
-                stats["total_revenue"] += price
-                
-                if s_name:
-                    service_counts[s_name] = service_counts.get(s_name, 0) + 1
-
-    # Re-build lists from daily_stats
-    stats["appointments_data"] = [] # Reset to fill with active
-    stats["cancelled_data"] = []    # New list
-    stats["revenue_data"] = []      # Reset
+            stats["count_today"] += data["booked"]
+        for name, count in data["services"].items():
+            service_counts[name] = service_counts.get(name, 0) + count
+    stats["total_revenue"] = total_revenue_cents / 100
     
-    for label in stats["labels"]:
-        data = daily_stats.get(label, {"active": 0, "cancelled": 0, "revenue": 0.0})
+    for i in range(num_days):
+        d = start_dt + timedelta(days=i)
+        data = daily_stats.get(d, {"active": 0, "cancelled": 0, "revenue_cents": 0})
+        stats["labels"].append(d.strftime("%d/%m"))
         stats["appointments_data"].append(data["active"])
         stats["cancelled_data"].append(data["cancelled"])
-        stats["revenue_data"].append(data["revenue"])
-        
-    sorted_services = sorted(service_counts.items(), key=lambda item: item[1], reverse=True)[:5]
+        stats["revenue_data"].append(data["revenue_cents"] / 100)
+    
+    sorted_services = sorted(service_counts.items(), key=lambda item: (-item[1], item[0]))[:5]
     for name, count in sorted_services:
         stats["service_distribution"]["labels"].append(name)
         stats["service_distribution"]["data"].append(count)
         
     return stats
 
+# =============== CACHE STATS ===============
+
+@router.get("/cache-stats")
+def get_cache_stats(current_user: models.User = Depends(get_current_admin_user)):
+    """Hit/miss counters of the in-process caches"""
+    return {"availability": availability.slot_cache.stats(), "principals": principal_cache.stats()}
+
 # =============== APPOINTMENT STATUS ===============
 
 @router.put("/appointments/{appointment_id}/complete")
@@ -365,8 +352,9 @@ def complete_appointment(
     if not appointment:
         raise HTTPException(status_code=404, detail="Agendamento não encontrado")
     
-    appointment.status = "completed"
+    stats_rollup.change_status(db, appointment, "completed")
     db.commit()
+    availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
     return {"ok": True, "status": "completed"}
 
 
@@ -381,8 +369,9 @@ def mark_no_show(
     if not appointment:
         raise HTTPException(status_code=404, detail="Agendamento não encontrado")
     
-    appointment.status = "no_show"
+    stats_rollup.change_status(db, appointment, "no_show")
     db.commit()
+    availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
     return {"ok": True, "status": "no_show"}
 
 
@@ -427,7 +416,7 @@ def submit_feedback(
             raise HTTPException(status_code=403, detail="Você não tem permissão para alterar este agendamento")
             
     if feedback.status:
-        appointment.status = feedback.status
+        stats_rollup.change_status(db, appointment, feedback.status)
     if feedback.notes:
         appointment.feedback_notes = feedback.notes
         
@@ -440,4 +429,18 @@ def submit_feedback(
         db.add(media)
         
     db.commit()
-    return {"ok": True, "appointment_id": appointment.id}
\ No newline at end of file
+    if feedback.status:
+        availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
+    return {"ok": True, "appointment_id": appointment.id}
+
+# =============== PROFILES ===============
+
+@router.get("/profiles")
+def list_profiles(current_user: models.User = Depends(get_current_admin_user)):
+    """Request profiles captured with the X-Profile header or ?profile=1, newest first"""
+    return profiling.list_profiles()
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, current_user: models.User = Depends(get_current_admin_user)):
+    """A captured profile in folded-stack format (flamegraph.pl, speedscope)"""
+    return FileResponse(profiling.profile_path(name), media_type="text/plain", filename=name)
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 from jose import jwt, JWTError
+from starlette.concurrency import run_in_threadpool
 import bcrypt
 import os
+import threading
+import time
 import warnings
 import models, schemas
-from database import get_db
+from database import get_db, run_db
+from hashing import HashingPoolFull, bcrypt_rounds, hashing_pool, needs_rehash
+from ratelimit import create_limiter
 
 router = APIRouter(
     prefix="/auth",
@@ -25,92 +32,146 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440
 # Rate limiting configuration
 RATE_LIMIT_DELAYS = [0, 0, 5, 30, 60, 120]  # seconds per attempt count
 
+# Optional audit log of failed logins in login_attempts (the limiter itself
+# never touches the database); rows older than the retention are deleted
+LOGIN_AUDIT = os.getenv("LOGIN_AUDIT", "0").lower() in ("1", "true", "yes")
+LOGIN_AUDIT_RETENTION_DAYS = int(os.getenv("LOGIN_AUDIT_RETENTION_DAYS", "30"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Principal cache bounds. Entries never outlive the token's own expiry; the
+# TTL bounds staleness in multi-worker setups, where an edit handled by
+# another process cannot invalidate this process' entries.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
 
-def get_rate_limit_delay(attempts: int) -> int:
-    """Get delay in seconds based on attempt count"""
-    if attempts < len(RATE_LIMIT_DELAYS):
-        return RATE_LIMIT_DELAYS[attempts]
-    return RATE_LIMIT_DELAYS[-1]
 
+login_limiter = create_limiter(RATE_LIMIT_DELAYS)
 
-def check_rate_limit(db: Session, identifier: str) -> Optional[int]:
-    """Check if identifier is rate limited. Returns seconds to wait or None if allowed."""
-    attempt = db.query(models.LoginAttempt).filter(
-        models.LoginAttempt.identifier == identifier
-    ).first()
-    
-    if not attempt:
-        return None
-    
-    if attempt.locked_until and attempt.locked_until > datetime.utcnow():
-        remaining = (attempt.locked_until - datetime.utcnow()).total_seconds()
-        return int(remaining) + 1
-    
-    return None
+_last_audit_prune = 0.0
 
 
-def record_failed_attempt(db: Session, identifier: str):
-    """Record a failed login attempt and set lockout if needed"""
-    attempt = db.query(models.LoginAttempt).filter(
-        models.LoginAttempt.identifier == identifier
-    ).first()
-    
-    if not attempt:
-        attempt = models.LoginAttempt(
-            identifier=identifier,
-            attempts=1,
-            last_attempt=datetime.utcnow()
-        )
-        db.add(attempt)
-    else:
-        attempt.attempts += 1
-        attempt.last_attempt = datetime.utcnow()
-    
-    # Set lockout based on attempts
-    delay = get_rate_limit_delay(attempt.attempts)
-    if delay > 0:
-        attempt.locked_until = datetime.utcnow() + timedelta(seconds=delay)
-    
+def prune_login_audit(db: Session) -> int:
+    """Delete audit rows older than LOGIN_AUDIT_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=LOGIN_AUDIT_RETENTION_DAYS)
+    deleted = db.query(models.LoginAttempt).filter(
+        models.LoginAttempt.last_attempt < cutoff
+    ).delete(synchronize_session=False)
     db.commit()
-    return delay
+    return deleted
+
+
+def audit_failed_login(db: Session, identifier: str, attempts: int, delay: int):
+    """Record a failed login in login_attempts when LOGIN_AUDIT is on"""
+    global _last_audit_prune
+    if not LOGIN_AUDIT:
+        return
+    now = datetime.utcnow()
+    db.add(models.LoginAttempt(
+        identifier=identifier,
+        attempts=attempts,
+        locked_until=now + timedelta(seconds=delay) if delay else None,
+        last_attempt=now
+    ))
+    db.commit()
+    # Expire old rows at most once an hour per process
+    if time.time() - _last_audit_prune > 3600:
+        _last_audit_prune = time.time()
+        prune_login_audit(db)
 
 
-def clear_failed_attempts(db: Session, identifier: str):
-    """Clear failed attempts after successful login"""
-    db.query(models.LoginAttempt).filter(
-        models.LoginAttempt.identifier == identifier
-    ).delete()
-    db.commit()
+def record_failed_login(db: Session, identifier: str) -> Tuple[int, int]:
+    """Count a failure in the limiter and audit it; returns (attempts, lockout seconds)"""
+    attempts, delay = login_limiter.record_failure(identifier)
+    audit_failed_login(db, identifier, attempts, delay)
+    return attempts, delay
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password"""
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     password_byte_enc = plain_password.encode('utf-8')
     hashed_password_byte_enc = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_byte_enc, hashed_password_byte_enc)
 
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
+def _hashpw(password: str) -> str:
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=bcrypt_rounds())
     hashed_password = bcrypt.hashpw(pwd_bytes, salt)
     return hashed_password.decode('utf-8')
 
 
-def authenticate_user(db: Session, username: str, password: str):
+# bcrypt always runs on the bounded hashing pool (503 when it is full). Async
+# endpoints must use the *_async variants so the event loop is never blocked.
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain password against a hashed password"""
+    return hashing_pool.run(_checkpw, plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """Hash a password"""
+    return hashing_pool.run(_hashpw, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password for async endpoints"""
+    return await hashing_pool.run_async(_checkpw, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash for async endpoints"""
+    return await hashing_pool.run_async(_hashpw, password)
+
+
+def _store_password_hash(db: Session, model, account_id: int, hashed_password: str):
+    db.query(model).filter(model.id == account_id).update(
+        {"hashed_password": hashed_password}, synchronize_session=False
+    )
+    db.commit()
+
+
+async def rehash_if_needed(db: Session, account, password: str):
+    """After a successful login, re-hash a password stored below the current bcrypt cost"""
+    try:
+        # On the pool: the first call may calibrate the cost
+        if not await hashing_pool.run_async(needs_rehash, account.hashed_password):
+            return
+        hashed_password = await get_password_hash_async(password)
+    except HashingPoolFull:
+        return  # best effort: the next login tries again
+    # The account is detached (connection released before hashing): update by id
+    await run_db(db, _store_password_hash, type(account), account.id, hashed_password)
+    account.hashed_password = hashed_password
+
+
+def find_principal(db: Session, username: str):
+    """(account, role) for a login name, in one indexed query; (None, None) if unknown"""
+    principals = models.PrincipalIndex
+    row = db.query(principals.role, models.User, models.Barber).outerjoin(
+        models.User, and_(principals.role == "admin", models.User.id == principals.account_id)
+    ).outerjoin(
+        models.Barber, and_(principals.role == "barber", models.Barber.id == principals.account_id)
+    ).filter(principals.username == username).first()
+    if row is None:
+        return None, None
+    role, user, barber = row
+    return (user if role == "admin" else barber), role
+
+
+def username_taken(db: Session, username: str, role: Optional[str] = None, account_id: Optional[int] = None) -> bool:
+    """Whether another Admin or Barber already logs in with this username"""
+    principal = db.query(models.PrincipalIndex).filter(models.PrincipalIndex.username == username).first()
+    return principal is not None and (principal.role, principal.account_id) != (role, account_id)
+
+
+async def authenticate_user(db: Session, username: str, password: str):
     """Authenticate a user (Admin or Barber) by username and password"""
-    # 1. Try Admin/User
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user and verify_password(password, user.hashed_password):
-        return user, "admin"
+    account, role = await run_db(db, find_principal, username)
     
-    # 2. Try Barber
-    barber = db.query(models.Barber).filter(models.Barber.username == username).first()
-    if barber and barber.hashed_password and verify_password(password, barber.hashed_password):
-        return barber, "barber"
+    # Usernames are unique across Admins and Barbers: one account, one verify
+    if account and account.hashed_password and await verify_password_async(password, account.hashed_password):
+        await rehash_if_needed(db, account, password)
+        return account, role
         
     return None, None
 
@@ -127,13 +188,124 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+# =============== PRINCIPAL CACHE ===============
+
+class Principal:
+    """What the panel needs to know about an authenticated Admin or Barber"""
+
+    __slots__ = ("id", "role", "username", "is_admin", "is_active")
+
+    def __init__(self, id: int, role: str, username: str, is_admin: bool, is_active: bool):
+        self.id = id
+        self.role = role
+        self.username = username
+        self.is_admin = is_admin
+        self.is_active = is_active
+
+
+PrincipalKey = Tuple[str, int]  # (role, id)
+
+
+class PrincipalCache:
+    """Thread-safe LRU of token -> Principal with hit/miss counters"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._by_principal: Dict[PrincipalKey, Set[str]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        """Read before the DB lookup; pass to put() to drop results an edit made stale"""
+        with self._lock:
+            return self._generation
+
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float], generation: int):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            if self._generation != generation or expires_at <= time.time():
+                return
+            self._entries[token] = (expires_at, principal)
+            self._entries.move_to_end(token)
+            self._by_principal.setdefault((principal.role, principal.id), set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, role: str, principal_id: int):
+        """Forget every token of an Admin ("admin") or Barber ("barber")"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for token in list(self._by_principal.get((role, principal_id), ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_principal.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _drop(self, token: str):
+        _, principal = self._entries.pop(token)
+        key = (principal.role, principal.id)
+        tokens = self._by_principal.get(key)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_principal[key]
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Get the current authenticated user (Admin or Barber) from token"""
+    # A cached entry was decoded and looked up already, and expires with the token
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    generation = principal_cache.generation()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -151,9 +323,15 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
         
-    # Attach role to user object temporary for permission checks
-    user.role = role
-    return user
+    principal = Principal(
+        id=user.id,
+        role=role,
+        username=user.username,
+        is_admin=bool(getattr(user, "is_admin", False)),
+        is_active=bool(getattr(user, "is_active", True))
+    )
+    principal_cache.put(token, principal, payload.get("exp"), generation)
+    return principal
 
 
 def get_current_admin_user(current_user = Depends(get_current_user)):
@@ -182,7 +360,7 @@ async def login(
     identifier = f"{client_ip}:{form_data.username}"
     
     # Check rate limit
-    wait_time = check_rate_limit(db, identifier)
+    wait_time = await run_in_threadpool(login_limiter.check, identifier)
     if wait_time:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -190,10 +368,10 @@ async def login(
             headers={"Retry-After": str(wait_time)}
         )
     
-    user, role = authenticate_user(db, form_data.username, form_data.password)
+    user, role = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         # Record failed attempt
-        delay = record_failed_attempt(db, identifier)
+        attempts, delay = await run_db(db, record_failed_login, identifier)
         detail = "Usuário ou senha incorretos"
         if delay > 0:
             detail += f". Aguarde {delay} segundos para tentar novamente."
@@ -204,7 +382,7 @@ async def login(
         )
     
     # Clear failed attempts on success
-    clear_failed_attempts(db, identifier)
+    await run_in_threadpool(login_limiter.clear, identifier)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -224,20 +402,11 @@ async def login(
     return {"access_token": access_token, "token_type": "bearer", "role": role}
 
 
-@router.post("/register", response_model=schemas.User)
-async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Register a new user (admin only in production)"""
-    # Check if user exists
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+def _create_user(db: Session, username: str, hashed_password: str, is_admin: bool) -> models.User:
     db_user = models.User(
-        username=user.username,
+        username=username,
         hashed_password=hashed_password,
-        is_admin=user.is_admin
+        is_admin=is_admin
     )
     db.add(db_user)
     db.commit()
@@ -245,6 +414,18 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 
+@router.post("/register", response_model=schemas.User)
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Register a new user (admin only in production)"""
+    # Check if the username is taken (by an Admin or a Barber)
+    if await run_db(db, username_taken, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    
+    # Create new user
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_db(db, _create_user, user.username, hashed_password, user.is_admin)
+
+
 @router.get("/me", response_model=schemas.User)
 async def read_users_me(current_user: models.User = Depends(get_current_user)):
     """Get current user info"""
@@ -254,19 +435,11 @@ async def read_users_me(current_user: models.User = Depends(get_current_user)):
 @router.post("/init-admin")
 async def init_admin(db: Session = Depends(get_db)):
     """Initialize default admin user (only if no users exist)"""
-    user_count = db.query(models.User).count()
-    if user_count > 0:
+    if await run_db(db, lambda db: db.query(models.User).count() > 0):
         raise HTTPException(status_code=400, detail="Admin user already exists")
     
-    hashed_password = get_password_hash("admin123")
-    admin_user = models.User(
-        username="admin",
-        hashed_password=hashed_password,
-        is_admin=True
-    )
-    db.add(admin_user)
-    db.commit()
-    db.refresh(admin_user)
+    hashed_password = await get_password_hash_async("admin123")
+    await run_db(db, _create_user, "admin", hashed_password, True)
     return {"message": "Admin user created successfully", "username": "admin", "password": "admin123"}
 
 @router.post("/logout")
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from datetime import datetime, timedelta
 import models, schemas
-from database import get_db
-from routers.auth import get_password_hash, verify_password, create_access_token
+from database import get_db, begin_write_lock, run_db
+import availability
+import stats
+from pagination import paginate_appointments
+from routers.auth import get_password_hash_async, verify_password_async, rehash_if_needed, create_access_token
+from routers.user import validate_booking_barber, resolve_booking_duration, ensure_slot_free
 
 router = APIRouter(
     prefix="/customer",
@@ -26,9 +30,12 @@ def check_phone_exists(phone: str, db: Session = Depends(get_db)):
 
 # =============== CUSTOMER AUTHENTICATION ===============
 
-@router.post("/register", response_model=schemas.CustomerToken)
-def register_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
-    """Register a new customer account"""
+# Register and login are async so the bcrypt wait does not hold a threadpool
+# worker; the hash itself runs on the hashing pool (see hashing.py). Their
+# database work still blocks, so it runs in the threadpool, never on the loop.
+
+def ensure_customer_is_new(db: Session, customer: schemas.CustomerCreate):
+    """400 if the phone or email is already registered"""
     # Check if phone already exists
     existing = db.query(models.Customer).filter(models.Customer.phone == customer.phone).first()
     if existing:
@@ -39,9 +46,9 @@ def register_customer(customer: schemas.CustomerCreate, db: Session = Depends(ge
         existing_email = db.query(models.Customer).filter(models.Customer.email == customer.email).first()
         if existing_email:
             raise HTTPException(status_code=400, detail="Email já cadastrado")
-    
-    # Create customer
-    hashed_password = get_password_hash(customer.password)
+
+
+def create_customer(db: Session, customer: schemas.CustomerCreate, hashed_password: str) -> models.Customer:
     db_customer = models.Customer(
         name=customer.name,
         phone=customer.phone,
@@ -51,6 +58,21 @@ def register_customer(customer: schemas.CustomerCreate, db: Session = Depends(ge
     db.add(db_customer)
     db.commit()
     db.refresh(db_customer)
+    return db_customer
+
+
+def find_customer(db: Session, phone: str) -> Optional[models.Customer]:
+    return db.query(models.Customer).filter(models.Customer.phone == phone).first()
+
+
+@router.post("/register", response_model=schemas.CustomerToken)
+async def register_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
+    """Register a new customer account"""
+    await run_db(db, ensure_customer_is_new, customer)
+    
+    # Create customer
+    hashed_password = await get_password_hash_async(customer.password)
+    db_customer = await run_db(db, create_customer, customer, hashed_password)
     
     # Generate token
     access_token = create_access_token(data={"sub": f"customer:{db_customer.id}"})
@@ -62,7 +84,7 @@ def register_customer(customer: schemas.CustomerCreate, db: Session = Depends(ge
     }
 
 @router.post("/login", response_model=schemas.CustomerToken)
-def login_customer(credentials: schemas.CustomerLogin, db: Session = Depends(get_db)):
+async def login_customer(credentials: schemas.CustomerLogin, db: Session = Depends(get_db)):
     """Login customer with phone and password"""
     # Normalize phone
     try:
@@ -70,9 +92,10 @@ def login_customer(credentials: schemas.CustomerLogin, db: Session = Depends(get
     except ValueError:
         raise HTTPException(status_code=400, detail="Telefone inválido")
     
-    customer = db.query(models.Customer).filter(models.Customer.phone == normalized_phone).first()
-    if not customer or not verify_password(credentials.password, customer.hashed_password):
+    customer = await run_db(db, find_customer, normalized_phone)
+    if not customer or not await verify_password_async(credentials.password, customer.hashed_password):
         raise HTTPException(status_code=401, detail="Telefone ou senha incorretos")
+    await rehash_if_needed(db, customer, credentials.password)
     
     access_token = create_access_token(data={"sub": f"customer:{customer.id}"})
     
@@ -84,8 +107,8 @@ def login_customer(credentials: schemas.CustomerLogin, db: Session = Depends(get
 
 # =============== CUSTOMER PROFILE ===============
 
-def get_current_customer(token: str, db: Session):
-    """Utility to get current customer from token"""
+def decode_customer_token(token: str) -> Optional[int]:
+    """Customer id from a customer token, without touching the DB"""
     from jose import JWTError, jwt
     from routers.auth import SECRET_KEY, ALGORITHM
     
@@ -94,11 +117,17 @@ def get_current_customer(token: str, db: Session):
         sub = payload.get("sub")
         if not sub or not sub.startswith("customer:"):
             return None
-        customer_id = int(sub.split(":")[1])
-        return db.query(models.Customer).filter(models.Customer.id == customer_id).first()
+        return int(sub.split(":")[1])
     except (JWTError, ValueError):
         return None
 
+def get_current_customer(token: str, db: Session):
+    """Utility to get current customer from token"""
+    customer_id = decode_customer_token(token)
+    if customer_id is None:
+        return None
+    return db.query(models.Customer).filter(models.Customer.id == customer_id).first()
+
 @router.get("/profile", response_model=schemas.Customer)
 def get_profile(token: str, db: Session = Depends(get_db)):
     """Get current customer profile"""
@@ -125,47 +154,51 @@ def update_profile(token: str, update: schemas.CustomerUpdate, db: Session = Dep
 
 # =============== APPOINTMENT HISTORY ===============
 
+HISTORY_PAGE_SIZE = 20  # page size when only a cursor is given
+
 @router.get("/history", response_model=List[schemas.AppointmentHistory])
-def get_appointment_history(token: str, db: Session = Depends(get_db)):
-    """Get customer's appointment history"""
+def get_appointment_history(
+    token: str,
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=200),
+    cursor: Optional[str] = None,  # X-Next-Cursor from the previous page
+    db: Session = Depends(get_db)
+):
+    """Get customer's appointment history, newest first (all of it unless a limit is given)"""
     customer = get_current_customer(token, db)
     if not customer:
         raise HTTPException(status_code=401, detail="Não autenticado")
     
-    appointments = db.query(models.Appointment).filter(
+    # Service details come from the snapshot; the barber's name is joined in
+    query = db.query(models.Appointment).options(
+        joinedload(models.Appointment.barber)
+    ).filter(
         models.Appointment.customer_id == customer.id
-    ).order_by(models.Appointment.start_time.desc()).all()
+    )
+    if limit is None and cursor is None:
+        appointments = query.order_by(
+            models.Appointment.start_time.desc(), models.Appointment.id.desc()
+        ).all()
+    else:
+        appointments = paginate_appointments(
+            query, response, limit or HISTORY_PAGE_SIZE, cursor, descending=True
+        )
     
     result = []
     for app in appointments:
         barber_name = app.barber.name if app.barber else None
-        service_name = None
-        duration = None
-        price = None
-        if app.barber_service:
-            service_name = app.barber_service.name
-            duration = app.barber_service.duration_minutes
-            price = app.barber_service.price
-        elif app.service:
-            service_name = app.service.name
-            duration = app.service.duration_minutes
-            # Legacy price was string, let's try to parse or just leave None if float expected
-            try:
-                price = float(app.service.price)
-            except:
-                price = 0.0
-        
+        # Service details are the snapshot taken at booking time
         result.append({
             "id": app.id,
             "start_time": app.start_time,
             "end_time": app.end_time,
             "barber_name": barber_name,
-            "service_name": service_name,
+            "service_name": app.service_name,
             "barber_id": app.barber_id,
             "barber_service_id": app.barber_service_id,
             "service_id": app.service_id,
-            "duration_minutes": duration,
-            "price": price,
+            "duration_minutes": app.duration_minutes,
+            "price": app.price_cents / 100 if app.price_cents is not None else None,
             "status": app.status
         })
     
@@ -194,7 +227,76 @@ def cancel_appointment(appointment_id: int, token: str, db: Session = Depends(ge
          raise HTTPException(status_code=400, detail="Não é possível cancelar agendamentos passados")
 
     # Soft delete: update status to 'cancelled' so it stays in history
-    appointment.status = "cancelled"
+    stats.change_status(db, appointment, "cancelled")
     db.commit()
+    availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
     
     return {"message": "Agendamento cancelado com sucesso"}
+
+@router.post("/appointments/{appointment_id}/reschedule", response_model=schemas.Appointment)
+def reschedule_appointment(
+    appointment_id: int,
+    token: str,
+    reschedule: schemas.AppointmentReschedule,
+    db: Session = Depends(get_db)
+):
+    """Move a scheduled appointment to a new slot in a single transaction"""
+    # Lock before the first query so the conflict check and update are atomic
+    begin_write_lock(db)
+    customer = get_current_customer(token, db)
+    if not customer:
+        raise HTTPException(status_code=401, detail="Não autenticado")
+    
+    appointment = db.query(models.Appointment).filter(
+        models.Appointment.id == appointment_id,
+        models.Appointment.customer_id == customer.id
+    ).first()
+    
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+    
+    if appointment.status != "scheduled":
+        raise HTTPException(status_code=400, detail="Apenas agendamentos ativos podem ser remarcados")
+    
+    if appointment.start_time < datetime.now():
+        raise HTTPException(status_code=400, detail="Não é possível remarcar agendamentos passados")
+    
+    # Keep the current barber/service unless new ones are given
+    barber_id = reschedule.barber_id or appointment.barber_id
+    if reschedule.barber_service_id or reschedule.service_id:
+        barber_service_id, service_id = reschedule.barber_service_id, reschedule.service_id
+    elif barber_id == appointment.barber_id:
+        barber_service_id, service_id = appointment.barber_service_id, appointment.service_id
+    else:
+        raise HTTPException(status_code=400, detail="É necessário informar um serviço do novo barbeiro")
+    
+    barber = validate_booking_barber(db, barber_id)
+    duration_minutes = resolve_booking_duration(db, barber_id, barber_service_id, service_id)
+    end_time = reschedule.start_time + timedelta(minutes=duration_minutes)
+    
+    # The appointment being moved never conflicts with itself
+    ensure_slot_free(db, barber, reschedule.start_time, end_time, appointment.id)
+    
+    old_barber_id, old_day = appointment.barber_id, appointment.start_time.date()
+    stats.record_appointments(db, [appointment], -1)
+    if (barber_service_id, service_id) != (appointment.barber_service_id, appointment.service_id):
+        # A different service is charged at its current price; otherwise the booked price stands
+        snapshot = stats.service_snapshot(
+            db.get(models.BarberService, barber_service_id) if barber_service_id else None,
+            db.get(models.Service, service_id) if service_id and not barber_service_id else None
+        )
+        appointment.price_cents = snapshot["price_cents"]
+        appointment.service_name = snapshot["service_name"]
+    appointment.duration_minutes = duration_minutes
+    appointment.barber_id = barber_id
+    appointment.barber_service_id = barber_service_id
+    appointment.service_id = service_id
+    appointment.start_time = reschedule.start_time
+    appointment.end_time = end_time
+    stats.record_appointments(db, [appointment], 1)
+    db.commit()
+    db.refresh(appointment)
+    
+    availability.invalidate_day(old_barber_id, old_day)
+    availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
+    return appointment
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager, joinedload
 from datetime import datetime, timedelta
 from typing import Optional, List
 import models
@@ -14,6 +14,13 @@ router = APIRouter(
 # Stories are visible for 7 days
 STORIES_RETENTION_DAYS = 7
 
+# The appointment, its barber and service are read for every story: load them
+# with the media rows (reusing the JOIN) instead of one lazy load per story
+STORY_LOADS = contains_eager(models.AppointmentMedia.appointment).options(
+    joinedload(models.Appointment.barber),
+    joinedload(models.Appointment.barber_service)
+)
+
 
 @router.get("")
 def get_all_stories(
@@ -25,7 +32,7 @@ def get_all_stories(
     # Get all media from the last 7 days with appointment and barber info
     media_list = db.query(models.AppointmentMedia).join(
         models.Appointment
-    ).filter(
+    ).options(STORY_LOADS).filter(
         models.AppointmentMedia.created_at >= cutoff_date
     ).order_by(
         models.AppointmentMedia.created_at.desc()
@@ -73,7 +80,7 @@ def get_barber_stories(
     
     media_list = db.query(models.AppointmentMedia).join(
         models.Appointment
-    ).filter(
+    ).options(STORY_LOADS).filter(
         models.Appointment.barber_id == barber_id,
         models.AppointmentMedia.created_at >= cutoff_date
     ).order_by(
@@ -110,7 +117,7 @@ def get_recent_stories(
     
     media_list = db.query(models.AppointmentMedia).join(
         models.Appointment
-    ).filter(
+    ).options(STORY_LOADS).filter(
         models.AppointmentMedia.created_at >= cutoff_date
     ).order_by(
         models.AppointmentMedia.created_at.desc()
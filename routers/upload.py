@@ -6,6 +6,8 @@ import uuid
 import shutil
 import models
 from database import get_db
+import availability
+import stats
 from routers.auth import get_current_admin_user
 
 router = APIRouter(
@@ -117,11 +119,14 @@ async def upload_appointment_media(
     db.add(media)
     
     # Mark appointment as completed if not already
-    if appointment.status == "scheduled":
-        appointment.status = "completed"
+    status_changed = appointment.status == "scheduled"
+    if status_changed:
+        stats.change_status(db, appointment, "completed")
     
     db.commit()
     db.refresh(media)
+    if status_changed:
+        availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
     
     return {
         "id": media.id,
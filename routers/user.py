@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import and_, insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import models, schemas
-from database import get_db
+import asyncio
+import availability
+import stats
+import availability_stream
+from database import get_db, begin_write_lock
 
 router = APIRouter(
     tags=["user"]
@@ -14,7 +21,9 @@ router = APIRouter(
 @router.get("/barbers", response_model=List[schemas.Barber])
 def get_barbers(db: Session = Depends(get_db)):
     """Get all active barbers (public endpoint)"""
-    barbers = db.query(models.Barber).filter(models.Barber.is_active == True).all()
+    barbers = db.query(models.Barber).options(
+        selectinload(models.Barber.services)
+    ).filter(models.Barber.is_active == True).all()
     return barbers
 
 @router.get("/barbers/{barber_id}", response_model=schemas.Barber)
@@ -42,6 +51,133 @@ def get_public_services(skip: int = 0, limit: int = 100, db: Session = Depends(g
 
 # =============== AVAILABILITY ===============
 
+def parse_date(date_str: str) -> date:
+    """Parse a YYYY-MM-DD string or raise 400"""
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida, use o formato AAAA-MM-DD")
+
+@router.get("/availability/range")
+def get_availability_range(
+    start_date: str,
+    barber_id: int,
+    days: int = Query(default=7, ge=1, le=availability.MAX_RANGE_DAYS),
+    barber_service_id: Optional[int] = None,
+    service_id: Optional[int] = None,  # Legacy
+    db: Session = Depends(get_db)
+):
+    """Get available time slots for a barber across several consecutive days"""
+    first_date = parse_date(start_date)
+    
+    barber = db.query(models.Barber).filter(models.Barber.id == barber_id).first()
+    if not barber:
+        raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
+    if not barber.is_active:
+        return {"days": [], "message": "Barbeiro não está disponível"}
+    
+    duration_minutes = availability.resolve_duration(db, barber_id, barber_service_id, service_id)
+    slots_by_day = availability.range_slots(db, barber, first_date, days, duration_minutes)
+    
+    return {
+        "days": [
+            {"date": d.isoformat(), "slots": slots}
+            for d, slots in slots_by_day.items()
+        ]
+    }
+
+@router.get("/availability/earliest")
+def get_earliest_availability(
+    service_name: Optional[str] = None,
+    duration_minutes: Optional[int] = Query(default=None, ge=1),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(default=5, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Get the earliest free slots across all active barbers (any barber)"""
+    if not service_name and not duration_minutes:
+        raise HTTPException(status_code=400, detail="É necessário informar um serviço ou duração")
+    
+    window_start = schemas.as_local_time(start) or datetime.now()
+    window_end = schemas.as_local_time(end) or window_start + timedelta(days=7)
+    max_end = window_start + timedelta(days=availability.MAX_RANGE_DAYS)
+    if window_end > max_end:
+        window_end = max_end
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="Intervalo de datas inválido")
+    
+    barbers = db.query(models.Barber).options(
+        selectinload(models.Barber.services)
+    ).filter(models.Barber.is_active == True).all()
+    
+    # Pick, per barber, the service that matches the request
+    candidates = []
+    for barber in barbers:
+        if service_name:
+            wanted = service_name.strip().lower()
+            service = next((s for s in barber.services if s.name.strip().lower() == wanted), None)
+            if not service:
+                continue
+            candidates.append((barber, duration_minutes or service.duration_minutes, service))
+        else:
+            service = next((s for s in barber.services if s.duration_minutes == duration_minutes), None)
+            candidates.append((barber, duration_minutes, service))
+    
+    found = availability.earliest_slots(db, candidates, window_start, window_end, limit)
+    return {
+        "slots": [
+            {
+                "start_time": slot,
+                "date": slot.date().isoformat(),
+                "time": slot.strftime("%H:%M"),
+                "barber": schemas.BarberSimple.model_validate(barber),
+                "barber_service": schemas.BarberService.model_validate(service) if service else None
+            }
+            for slot, barber, service in found
+        ]
+    }
+
+@router.get("/availability/stream")
+async def stream_availability(
+    request: Request,
+    date_str: str,
+    barber_id: int,
+    barber_service_id: Optional[int] = None,
+    service_id: Optional[int] = None,  # Legacy
+):
+    """Server-Sent Events: current slots once, then diffs when bookings change"""
+    target_date = parse_date(date_str)
+    key = await run_in_threadpool(
+        availability_stream.subscription_key, barber_id, target_date, barber_service_id, service_id
+    )
+    
+    async def event_stream():
+        # Subscribe before taking the snapshot so no change is missed in between
+        subscription = availability_stream.broadcaster.subscribe(key)
+        try:
+            slots = (await run_in_threadpool(availability_stream.compute_slots, [key]))[key]
+            subscription.snapshot(slots)
+            yield availability_stream.format_event("slots", {"slots": slots})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(
+                        subscription.queue.get(), availability_stream.HEARTBEAT_SECONDS
+                    )
+                    yield availability_stream.format_event(event, data)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+        finally:
+            availability_stream.broadcaster.unsubscribe(key, subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/availability")
 def get_availability(
     date_str: str, 
@@ -51,7 +187,7 @@ def get_availability(
     db: Session = Depends(get_db)
 ):
     """Get available time slots for a barber on a specific date"""
-    target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    target_date = parse_date(date_str)
     
     # Get barber and their working hours
     barber = db.query(models.Barber).filter(models.Barber.id == barber_id).first()
@@ -60,80 +196,110 @@ def get_availability(
     if not barber.is_active:
         return {"slots": [], "message": "Barbeiro não está disponível"}
     
-    # Get service duration
-    duration_minutes = 30  # Default
+    duration_minutes = availability.resolve_duration(db, barber_id, barber_service_id, service_id)
+    slots_by_day = availability.range_slots(db, barber, target_date, 1, duration_minutes)
+    return {"slots": slots_by_day[target_date]}
+
+# =============== BOOKING ===============
+
+# How many alternative slots a 409 on /book suggests
+CONFLICT_ALTERNATIVES = 3
+
+class SlotConflictError(HTTPException):
+    """409 that also carries the nearest free slots (rendered by main.py)"""
+
+    def __init__(self, alternatives: List[datetime]):
+        super().__init__(status_code=409, detail="Horário já reservado por outro cliente")
+        self.alternatives = [
+            {"start_time": slot.isoformat(), "time": slot.strftime("%H:%M")}
+            for slot in alternatives
+        ]
+
+def validate_booking_barber(db: Session, barber_id: int) -> models.Barber:
+    """Load a bookable barber, locking it so concurrent bookings for it run one at a time"""
+    barber = availability.lock_barber(db, barber_id)
+    if not barber:
+        raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
+    if not barber.is_active:
+        raise HTTPException(status_code=400, detail="Barbeiro não está disponível")
+    return barber
+
+def resolve_booking_duration(
+    db: Session,
+    barber_id: int,
+    barber_service_id: Optional[int],
+    service_id: Optional[int]
+) -> int:
+    """Get duration from barber_service or service; the service is required"""
     if barber_service_id:
         barber_service = db.query(models.BarberService).filter(
             models.BarberService.id == barber_service_id,
             models.BarberService.barber_id == barber_id
         ).first()
-        if barber_service:
-            duration_minutes = barber_service.duration_minutes
+        if not barber_service:
+            raise HTTPException(status_code=404, detail="Serviço não encontrado para este barbeiro")
+        return barber_service.duration_minutes
     elif service_id:
         service = db.query(models.Service).filter(models.Service.id == service_id).first()
-        if service:
-            duration_minutes = service.duration_minutes
-
-    # Parse barber's working hours
-    try:
-        start_hour, start_min = map(int, barber.start_time.split(':'))
-        end_hour, end_min = map(int, barber.end_time.split(':'))
-        
-        # Parse break interval if exists
-        break_start = None
-        break_end = None
-        if barber.start_interval and barber.end_interval:
-             bs_h, bs_m = map(int, barber.start_interval.split(':'))
-             be_h, be_m = map(int, barber.end_interval.split(':'))
-             break_start = datetime.combine(target_date, datetime.min.time()).replace(hour=bs_h, minute=bs_m)
-             break_end = datetime.combine(target_date, datetime.min.time()).replace(hour=be_h, minute=be_m)
-
-    except (ValueError, AttributeError):
-        start_hour, start_min = 9, 0
-        end_hour, end_min = 18, 0
-        break_start = None
-        break_end = None
-    
-    work_start = datetime.combine(target_date, datetime.min.time()).replace(hour=start_hour, minute=start_min)
-    work_end = datetime.combine(target_date, datetime.min.time()).replace(hour=end_hour, minute=end_min)
-    
-    # Get existing appointments for this barber
-    appointments = db.query(models.Appointment).filter(
-        models.Appointment.barber_id == barber_id,
-        models.Appointment.status == "scheduled", # Only scheduled appointments block slots
-        models.Appointment.start_time >= work_start,
-        models.Appointment.start_time < work_end
-    ).all()
-    
-    # Generate slots
-    slots = []
-    current_time = work_start
-    while current_time + timedelta(minutes=duration_minutes) <= work_end:
-        slot_end = current_time + timedelta(minutes=duration_minutes)
-        
-        # Check Break Interval Collision
-        if break_start and break_end:
-            # If the slot overlaps with the break
-            # Overlap logic: (StartA < EndB) and (EndA > StartB)
-            if (current_time < break_end) and (slot_end > break_start):
-                current_time += timedelta(minutes=30)
-                continue
+        if not service:
+            raise HTTPException(status_code=404, detail="Serviço não encontrado")
+        return service.duration_minutes
+    raise HTTPException(status_code=400, detail="É necessário informar um serviço")
 
-        # Check collision
-        is_free = True
-        for apt in appointments:
-            if (current_time < apt.end_time) and (slot_end > apt.start_time):
-                is_free = False
-                break
-        
-        if is_free:
-            slots.append(current_time.strftime("%H:%M"))
-        
-        current_time += timedelta(minutes=30)
-        
-    return {"slots": slots}
+def ensure_slot_free(
+    db: Session,
+    barber: models.Barber,
+    start_time: datetime,
+    end_time: datetime,
+    exclude_appointment_id: Optional[int] = None
+):
+    """Raise 409 with nearby alternatives if the slot overlaps another scheduled appointment"""
+    occupancy = availability.day_occupancy(
+        db, barber.id, start_time.date(), end_time, exclude_appointment_id
+    )
+    if not occupancy.is_free(start_time, end_time):
+        duration_minutes = int((end_time - start_time).total_seconds() // 60)
+        raise SlotConflictError(availability.nearest_free_starts(
+            barber, occupancy, start_time, duration_minutes,
+            CONFLICT_ALTERNATIVES, not_before=datetime.now()
+        ))
 
-# =============== BOOKING ===============
+def load_booking_context(
+    db: Session,
+    barber_id: int,
+    barber_service_id: Optional[int],
+    service_id: Optional[int],
+    customer_id: Optional[int]
+):
+    """Barber (locked), service and customer for a booking in one joined query"""
+    if not barber_service_id and not service_id:
+        raise HTTPException(status_code=400, detail="É necessário informar um serviço")
+    legacy_service_id = service_id if not barber_service_id else None
+    
+    begin_write_lock(db)
+    row = db.query(models.Barber, models.BarberService, models.Service, models.Customer.id).outerjoin(
+        models.BarberService, and_(
+            models.BarberService.id == barber_service_id,
+            models.BarberService.barber_id == models.Barber.id
+        )
+    ).outerjoin(
+        models.Service, models.Service.id == legacy_service_id
+    ).outerjoin(
+        models.Customer, models.Customer.id == customer_id
+    ).filter(
+        models.Barber.id == barber_id
+    ).with_for_update(of=models.Barber).first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
+    barber, barber_service, service, found_customer_id = row
+    if not barber.is_active:
+        raise HTTPException(status_code=400, detail="Barbeiro não está disponível")
+    if barber_service_id and not barber_service:
+        raise HTTPException(status_code=404, detail="Serviço não encontrado para este barbeiro")
+    if legacy_service_id and not service:
+        raise HTTPException(status_code=404, detail="Serviço não encontrado")
+    return barber, barber_service, service, found_customer_id
 
 @router.post("/book", response_model=schemas.Appointment)
 def book_appointment(
@@ -143,60 +309,165 @@ def book_appointment(
 ):
     """Book an appointment with a barber. Optionally link to customer profile."""
     
-    # Validate barber
-    barber = db.query(models.Barber).filter(models.Barber.id == appointment.barber_id).first()
-    if not barber:
-        raise HTTPException(status_code=404, detail="Barbeiro não encontrado")
-    if not barber.is_active:
-        raise HTTPException(status_code=400, detail="Barbeiro não está disponível")
-    
-    # Get duration from barber_service or service
-    duration_minutes = 30  # Default
-    if appointment.barber_service_id:
-        barber_service = db.query(models.BarberService).filter(
-            models.BarberService.id == appointment.barber_service_id,
-            models.BarberService.barber_id == appointment.barber_id
-        ).first()
-        if not barber_service:
-            raise HTTPException(status_code=404, detail="Serviço não encontrado para este barbeiro")
-        duration_minutes = barber_service.duration_minutes
-    elif appointment.service_id:
-        service = db.query(models.Service).filter(models.Service.id == appointment.service_id).first()
-        if not service:
-            raise HTTPException(status_code=404, detail="Serviço não encontrado")
-        duration_minutes = service.duration_minutes
-    else:
-        raise HTTPException(status_code=400, detail="É necessário informar um serviço")
-    
-    # Try to get customer from token
+    # The customer token is decoded locally; its row is checked in the joined fetch
     customer_id = None
     if customer_token:
-        from routers.customer import get_current_customer
-        customer = get_current_customer(customer_token, db)
-        if customer:
-            customer_id = customer.id
+        from routers.customer import decode_customer_token
+        customer_id = decode_customer_token(customer_token)
+    
+    barber, barber_service, service, customer_id = load_booking_context(
+        db, appointment.barber_id, appointment.barber_service_id, appointment.service_id, customer_id
+    )
+    duration_minutes = (barber_service or service).duration_minutes
         
     # Calculate end time
     end_time = appointment.start_time + timedelta(minutes=duration_minutes)
 
-    # Check for conflicts (Overlapping appointments)
-    # Logic: (StartA < EndB) and (EndA > StartB)
-    existing_appointment = db.query(models.Appointment).filter(
-        models.Appointment.barber_id == appointment.barber_id,
-        models.Appointment.status == "scheduled", # Only check active appointments
-        models.Appointment.start_time < end_time,
-        models.Appointment.end_time > appointment.start_time
-    ).first()
-
-    if existing_appointment:
-        raise HTTPException(status_code=409, detail="Horário já reservado por outro cliente")
+    # Check for conflicts against the barber's occupancy for that day
+    ensure_slot_free(db, barber, appointment.start_time, end_time)
     
     db_appointment = models.Appointment(
         **appointment.model_dump(),
+        **stats.service_snapshot(barber_service, service),
         customer_id=customer_id,
         end_time=end_time
     )
+    # Attach the loaded rows so serializing needs no lazy loads
+    db_appointment.barber = barber
+    if barber_service:
+        db_appointment.barber_service = barber_service
+    if service:
+        db_appointment.service = service
     db.add(db_appointment)
+    db.flush()
+    stats.record_appointments(db, [db_appointment], 1)
+    
+    # Serialize before commit: committing expires the objects and would cost a refresh
+    result = schemas.Appointment.model_validate(db_appointment)
+    db.commit()
+    availability.invalidate_day(appointment.barber_id, appointment.start_time.date())
+    return result
+
+@router.post("/book/batch", response_model=schemas.BatchBookingResponse)
+def book_batch(
+    booking: schemas.BatchBookingCreate,
+    customer_token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Book a recurring slot or several back-to-back slots in one transaction"""
+    barber = validate_booking_barber(db, booking.barber_id)
+    
+    # Resolve every service the batch needs with one query per kind
+    if booking.items is not None:
+        # Items without a service use the batch's service
+        entries = []
+        for item in booking.items:
+            if item.barber_service_id or item.service_id:
+                bs_id, s_id = item.barber_service_id, item.service_id
+            else:
+                bs_id, s_id = booking.barber_service_id, booking.service_id
+            entries.append((item.customer_name or booking.customer_name, bs_id, None if bs_id else s_id))
+    else:
+        bs_id, s_id = booking.barber_service_id, booking.service_id
+        entries = [(booking.customer_name, bs_id, None if bs_id else s_id)]
+    if any(not bs_id and not s_id for _, bs_id, s_id in entries):
+        raise HTTPException(status_code=400, detail="É necessário informar um serviço")
+    
+    snapshots = {}
+    barber_service_ids = {bs_id for _, bs_id, _ in entries if bs_id}
+    if barber_service_ids:
+        for service in db.query(models.BarberService).filter(
+            models.BarberService.id.in_(barber_service_ids),
+            models.BarberService.barber_id == barber.id
+        ).all():
+            snapshots[("barber_service", service.id)] = stats.service_snapshot(barber_service=service)
+    service_ids = {s_id for _, bs_id, s_id in entries if s_id and not bs_id}
+    if service_ids:
+        for service in db.query(models.Service).filter(models.Service.id.in_(service_ids)).all():
+            snapshots[("service", service.id)] = stats.service_snapshot(service=service)
+    
+    # Plan (customer_name, barber_service_id, service_id, start, end) for each slot
+    planned = []
+    if booking.recurrence is not None:
+        name, bs_id, s_id = entries[0]
+        snapshot = snapshots.get(("barber_service", bs_id) if bs_id else ("service", s_id))
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Serviço não encontrado para este barbeiro")
+        duration = snapshot["duration_minutes"]
+        for i in range(booking.recurrence.count):
+            start = booking.start_time + timedelta(weeks=i * booking.recurrence.every_weeks)
+            planned.append((name, bs_id, s_id, start, start + timedelta(minutes=duration)))
+    else:
+        start = booking.start_time
+        for name, bs_id, s_id in entries:
+            snapshot = snapshots.get(("barber_service", bs_id) if bs_id else ("service", s_id))
+            if snapshot is None:
+                raise HTTPException(status_code=404, detail="Serviço não encontrado para este barbeiro")
+            duration = snapshot["duration_minutes"]
+            planned.append((name, bs_id, s_id, start, start + timedelta(minutes=duration)))
+            start += timedelta(minutes=duration)
+    
+    customer_id = None
+    if customer_token:
+        from routers.customer import get_current_customer
+        customer = get_current_customer(customer_token, db)
+        if customer:
+            customer_id = customer.id
+    
+    # One range query covers every planned slot
+    busy = availability.load_busy_intervals(db, barber.id, planned[0][3], planned[-1][4])
+    starts = [interval[0] for interval in busy]
+    free = [not availability.overlaps_busy(busy, starts, p[3], p[4]) for p in planned]
+    
+    if not all(free) and not booking.allow_partial:
+        taken = ", ".join(p[3].strftime("%d/%m %H:%M") for p, ok in zip(planned, free) if not ok)
+        raise HTTPException(status_code=409, detail=f"Horários já reservados: {taken}")
+    
+    rows = [
+        {
+            "customer_name": name,
+            "customer_phone": booking.customer_phone,
+            "customer_id": customer_id,
+            "barber_id": barber.id,
+            "barber_service_id": bs_id,
+            "service_id": s_id,
+            "start_time": start,
+            "end_time": end,
+            "status": "scheduled",
+            **snapshots[("barber_service", bs_id) if bs_id else ("service", s_id)]
+        }
+        for (name, bs_id, s_id, start, end), ok in zip(planned, free) if ok
+    ]
+    created = {}
+    if rows:
+        # One executemany INSERT, then read the rows back with their relations
+        db.execute(insert(models.Appointment), rows)
+        booked_starts = [row["start_time"] for row in rows]
+        appointments = db.query(models.Appointment).options(
+            joinedload(models.Appointment.barber),
+            joinedload(models.Appointment.barber_service),
+            joinedload(models.Appointment.service)
+        ).filter(
+            models.Appointment.barber_id == barber.id,
+            models.Appointment.status == "scheduled",
+            models.Appointment.start_time.in_(booked_starts)
+        ).all()
+        stats.record_appointments(db, appointments, 1)
+        for appointment in appointments:
+            created[appointment.start_time] = schemas.Appointment.model_validate(appointment)
+    
+    # Serialized before commit so nothing is reloaded afterwards
+    results = [
+        schemas.BatchBookingResult(
+            start_time=start,
+            end_time=end,
+            status="booked" if ok else "conflict",
+            appointment=created.get(start) if ok else None
+        )
+        for (_, _, _, start, end), ok in zip(planned, free)
+    ]
     db.commit()
-    db.refresh(db_appointment)
-    return db_appointment
+    
+    for day in {row["start_time"].date() for row in rows}:
+        availability.invalidate_day(booking.barber_id, day)
+    return {"booked": len(rows), "results": results}
@@ -131,6 +131,14 @@ def validate_brazilian_phone(phone: str) -> str:
     else:
         return f"({digits[:2]}) {digits[2:6]}-{digits[6:]}"
 
+# =============== Time Helper ===============
+
+def as_local_time(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive local time, like the appointments and datetime.now(); aware values are converted"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
 # =============== Customer Schemas ===============
 
 class CustomerCreate(BaseModel):
@@ -197,14 +205,34 @@ class AppointmentBase(BaseModel):
     def validate_phone(cls, v):
         return validate_brazilian_phone(v)
 
+    @field_validator('start_time')
+    @classmethod
+    def validate_start_time(cls, v):
+        return as_local_time(v)
+
 class AppointmentCreate(AppointmentBase):
     pass
 
+class AppointmentReschedule(BaseModel):
+    """New slot for an existing appointment; barber/service default to the current ones"""
+    start_time: datetime
+    barber_id: Optional[int] = None
+    barber_service_id: Optional[int] = None
+    service_id: Optional[int] = None  # Legacy
+
+    @field_validator('start_time')
+    @classmethod
+    def validate_start_time(cls, v):
+        return as_local_time(v)
+
 class Appointment(AppointmentBase):
     id: int
     end_time: datetime
     status: str = "scheduled"
     feedback_notes: Optional[str] = None
+    price_cents: Optional[int] = None
+    service_name: Optional[str] = None
+    duration_minutes: Optional[int] = None
     barber: Optional[BarberSimple] = None
     barber_service: Optional[BarberService] = None
     service: Optional[Service] = None  # Legacy
@@ -212,6 +240,51 @@ class Appointment(AppointmentBase):
     class Config:
         from_attributes = True
 
+# =============== Batch Booking Schemas ===============
+
+class RecurrenceRule(BaseModel):
+    """Same slot every N weeks"""
+    every_weeks: int
+    count: int
+
+    @model_validator(mode='after')
+    def validate_rule(self):
+        if not 1 <= self.every_weeks <= 8:
+            raise ValueError('Intervalo deve ser entre 1 e 8 semanas')
+        if not 1 <= self.count <= 26:
+            raise ValueError('Quantidade deve ser entre 1 e 26 agendamentos')
+        return self
+
+class BatchBookingItem(BaseModel):
+    """One of several back-to-back slots (e.g. one per kid)"""
+    customer_name: Optional[str] = None  # Defaults to the batch customer
+    barber_service_id: Optional[int] = None
+    service_id: Optional[int] = None  # Legacy
+
+class BatchBookingCreate(AppointmentBase):
+    """Either a recurrence of the base slot or a list of consecutive slots"""
+    recurrence: Optional[RecurrenceRule] = None
+    items: Optional[List[BatchBookingItem]] = None
+    allow_partial: bool = False
+
+    @model_validator(mode='after')
+    def validate_mode(self):
+        if (self.recurrence is None) == (self.items is None):
+            raise ValueError('Informe recurrence ou items')
+        if self.items is not None and not 1 <= len(self.items) <= 10:
+            raise ValueError('Informe entre 1 e 10 itens')
+        return self
+
+class BatchBookingResult(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    status: str  # booked or conflict
+    appointment: Optional[Appointment] = None
+
+class BatchBookingResponse(BaseModel):
+    booked: int
+    results: List[BatchBookingResult]
+
 # =============== Appointment Media Schemas ===============
 
 class AppointmentMediaBase(BaseModel):
@@ -637,6 +637,14 @@ function formatDateBR(dateStr) {
 }
 
 let slotsPollInterval = null;
+let slotsEventSource = null;
+
+function stopSlotUpdates() {
+    if (slotsPollInterval) clearInterval(slotsPollInterval);
+    slotsPollInterval = null;
+    if (slotsEventSource) slotsEventSource.close();
+    slotsEventSource = null;
+}
 
 async function loadSlots() {
     if (!selectedService) return;
@@ -646,44 +654,72 @@ async function loadSlots() {
     const container = document.getElementById("slots-container");
     container.innerHTML = '<p>Carregando...</p>';
 
-    // Clear previous poll
-    if (slotsPollInterval) clearInterval(slotsPollInterval);
+    // Close previous stream / poll
+    stopSlotUpdates();
+
+    let query = `date_str=${date}&barber_id=${selectedBarber.id}`;
+    if (selectedService.isBarberService) {
+        query += `&barber_service_id=${selectedService.id}`;
+    } else {
+        query += `&service_id=${selectedService.id}`;
+    }
+
+    let currentSlots = [];
+
+    const renderSlots = () => {
+        if (currentSlots.length === 0) {
+            container.innerHTML = '<p style="grid-column: 1/-1; text-align: center;">Nenhum horário disponível para esta data.</p>';
+            return;
+        }
+
+        // If selectedSlot is still in the new list, keep it selected style
+        const currentSelection = selectedSlot;
+
+        container.innerHTML = currentSlots.map(slot => `
+            <button class="btn slot-btn ${slot === currentSelection ? 'selected-slot' : ''}" 
+                    style="${slot === currentSelection ? 'background: var(--accent); color: var(--text-primary);' : ''}"
+                    onclick="selectSlot('${slot}')">${slot}</button>
+        `).join('');
+    };
 
     const fetchSlots = async () => {
         try {
-            let endpoint = `/availability?date_str=${date}&barber_id=${selectedBarber.id}`;
-            if (selectedService.isBarberService) {
-                endpoint += `&barber_service_id=${selectedService.id}`;
-            } else {
-                endpoint += `&service_id=${selectedService.id}`;
-            }
-
             // Here we use fetch directly to avoid fetchAPI missing issue
-            const res = await fetch(endpoint);
+            const res = await fetch(`/availability?${query}`);
             if (!res.ok) throw new Error('Failed');
             const data = await res.json();
-
-            if (data.slots.length === 0) {
-                container.innerHTML = '<p style="grid-column: 1/-1; text-align: center;">Nenhum horário disponível para esta data.</p>';
-                return;
-            }
-
-            // If selectedSlot is still in the new list, keep it selected style
-            const currentSelection = selectedSlot;
-
-            container.innerHTML = data.slots.map(slot => `
-                <button class="btn slot-btn ${slot === currentSelection ? 'selected-slot' : ''}" 
-                        style="${slot === currentSelection ? 'background: var(--accent); color: var(--text-primary);' : ''}"
-                        onclick="selectSlot('${slot}')">${slot}</button>
-            `).join('');
+            currentSlots = data.slots;
+            renderSlots();
         } catch (e) {
             container.innerHTML = '<p style="color: var(--danger);">Erro ao carregar horários.</p>';
         }
     };
 
-    await fetchSlots();
-    // Poll every 5 seconds to keep fresh
-    slotsPollInterval = setInterval(fetchSlots, 5000);
+    // Fallback for browsers without EventSource: poll every 5 seconds
+    if (typeof EventSource === 'undefined') {
+        await fetchSlots();
+        slotsPollInterval = setInterval(fetchSlots, 5000);
+        return;
+    }
+
+    // Server pushes the full list once, then only what changed
+    slotsEventSource = new EventSource(`/availability/stream?${query}`);
+    slotsEventSource.addEventListener('slots', (e) => {
+        currentSlots = JSON.parse(e.data).slots;
+        renderSlots();
+    });
+    slotsEventSource.addEventListener('diff', (e) => {
+        const diff = JSON.parse(e.data);
+        const removed = new Set(diff.removed);
+        currentSlots = currentSlots.filter(slot => !removed.has(slot)).concat(diff.added).sort();
+        renderSlots();
+    });
+    slotsEventSource.onerror = () => {
+        // EventSource reconnects on its own; show an error only if it gave up
+        if (slotsEventSource && slotsEventSource.readyState === EventSource.CLOSED) {
+            container.innerHTML = '<p style="color: var(--danger);">Erro ao carregar horários.</p>';
+        }
+    };
 }
 
 
@@ -755,8 +791,13 @@ async function confirmBooking(e) {
         bookingData.service_id = selectedService.id;
     }
 
+    // Rescheduling moves the existing appointment in a single request
+    const isReschedule = typeof rescheduleAppointmentId !== 'undefined' && rescheduleAppointmentId && customerToken;
+
     let url = '/book';
-    if (customerToken) {
+    if (isReschedule) {
+        url = `/customer/appointments/${rescheduleAppointmentId}/reschedule?token=${customerToken}`;
+    } else if (customerToken) {
         url += `?customer_token=${customerToken}`;
     }
 
@@ -768,7 +809,12 @@ async function confirmBooking(e) {
         });
 
         if (response.status === 409) {
-            alert('Ops! Este horário acabou de ser reservado por outra pessoa. A lista de horários será atualizada.');
+            const conflict = await response.json().catch(() => ({}));
+            let msg = 'Ops! Este horário acabou de ser reservado por outra pessoa. A lista de horários será atualizada.';
+            if (conflict.alternatives && conflict.alternatives.length) {
+                msg += `\n\nHorários próximos disponíveis: ${conflict.alternatives.map(a => a.time).join(', ')}`;
+            }
+            alert(msg);
             goToStep(3); // Go back to slots
             loadSlots(); // Refresh
             return;
@@ -779,17 +825,7 @@ async function confirmBooking(e) {
             throw new Error(err.detail || 'Erro ao agendar');
         }
 
-        // Handle Reschedule: Cancel Old Appointment
-        if (typeof rescheduleAppointmentId !== 'undefined' && rescheduleAppointmentId) {
-            try {
-                // We use the same token as booking if available, or fetch current
-                const token = customerToken || getCustomerToken();
-                await fetch(`/customer/appointments/${rescheduleAppointmentId}/cancel?token=${token}`, { method: 'POST' });
-                // We could show a specific message
-            } catch (e) {
-                console.error("Failed to cancel old appointment during reschedule", e);
-                alert('Novo agendamento criado, mas falha ao cancelar o anterior. Por favor cancele manualmente.');
-            }
+        if (isReschedule) {
             rescheduleAppointmentId = null;
         }
 
@@ -0,0 +1,272 @@
+"""
+Daily appointment rollups for the dashboard.
+
+daily_barber_stats / daily_barber_service_stats hold, per barber and day, the
+active and cancelled counts, the revenue and the per-service counts. Write
+paths keep them current with record_appointments() / change_status(): the
+deltas are summed on the session and written when it commits, in the same
+transaction as the appointment change, with one upsert per rollup table. The
+dashboard only scans raw appointments for today onwards.
+
+rebuild() recomputes a date range from the appointments table (see
+rebuild_stats.py).
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+import models
+
+CANCELLED_STATUSES = ("cancelled", "no_show")
+BOOKED_STATUSES = ("scheduled", "completed")
+
+NO_BARBER = 0  # barber_id used in the rollup for appointments without a barber
+
+DayKey = Tuple[int, date]  # (barber_id, day)
+
+PENDING_KEY = "stats_pending"  # session.info key of the deltas not yet written
+
+
+def empty_day() -> dict:
+    return {"active": 0, "cancelled": 0, "booked": 0, "revenue_cents": 0, "services": {}}
+
+
+def parse_legacy_price(price_str: Optional[str]) -> Optional[float]:
+    """Legacy prices are strings like "R$ 30,00"; None when unparseable"""
+    if not price_str:
+        return None
+    try:
+        return float(price_str.replace("R$", "").replace(" ", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def to_cents(price: Optional[float]) -> Optional[int]:
+    return None if price is None else int(round(price * 100))
+
+
+def service_snapshot(
+    barber_service: Optional[models.BarberService] = None,
+    service: Optional[models.Service] = None
+) -> dict:
+    """Appointment columns frozen at booking time: charged price, service name and duration"""
+    if barber_service:
+        return {
+            "price_cents": to_cents(barber_service.discount_price or barber_service.price),
+            "service_name": barber_service.name,
+            "duration_minutes": barber_service.duration_minutes
+        }
+    if service:
+        return {
+            "price_cents": to_cents(parse_legacy_price(service.price)),
+            "service_name": service.name,
+            "duration_minutes": service.duration_minutes
+        }
+    return {"price_cents": None, "service_name": None, "duration_minutes": None}
+
+
+# =============== INCREMENTAL UPDATES ===============
+
+def record_appointments(db: Session, appointments: Iterable[models.Appointment], delta: int):
+    """Add (delta=1) or remove (delta=-1) appointments from the rollup, as they are now.
+
+    The change is written when the session commits.
+    """
+    days: Dict[DayKey, dict] = db.info.setdefault(PENDING_KEY, {})
+    for appointment in appointments:
+        data = days.setdefault(
+            (appointment.barber_id or NO_BARBER, appointment.start_time.date()), empty_day()
+        )
+        if appointment.status in CANCELLED_STATUSES:
+            data["cancelled"] += delta
+            continue
+        data["active"] += delta
+        data["revenue_cents"] += (appointment.price_cents or 0) * delta
+        if appointment.service_name:
+            name = appointment.service_name
+            data["services"][name] = data["services"].get(name, 0) + delta
+
+
+def change_status(db: Session, appointment: models.Appointment, status: str):
+    """Set an appointment's status, moving it between rollup buckets"""
+    if appointment.status == status:
+        return
+    record_appointments(db, [appointment], -1)
+    appointment.status = status
+    record_appointments(db, [appointment], 1)
+
+
+def write_pending(db: Session):
+    """Write the deltas recorded on this session: one upsert per rollup table"""
+    days: Dict[DayKey, dict] = db.info.pop(PENDING_KEY, {})
+    day_rows, service_rows = [], []
+    # Sorted so concurrent transactions lock the rows in the same order
+    for (barber_id, day), data in sorted(days.items()):
+        if data["active"] or data["cancelled"] or data["revenue_cents"]:
+            day_rows.append({
+                "barber_id": barber_id, "day": day,
+                "active_count": data["active"],
+                "cancelled_count": data["cancelled"],
+                "revenue_cents": data["revenue_cents"]
+            })
+        for name, count in sorted(data["services"].items()):
+            if count:
+                service_rows.append({"barber_id": barber_id, "day": day, "service_name": name, "count": count})
+    _upsert(db, models.DailyBarberStat, ("barber_id", "day"), day_rows)
+    _upsert(db, models.DailyBarberServiceStat, ("barber_id", "day", "service_name"), service_rows)
+
+
+def _upsert(db: Session, model, key: Tuple[str, ...], rows: List[dict]):
+    """INSERT the rows, adding their counters to the existing row on a key conflict"""
+    if not rows:
+        return
+    table = model.__table__
+    counters = [column for column in rows[0] if column not in key]
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        statement = statement.on_duplicate_key_update(
+            {column: table.c[column] + statement.inserted[column] for column in counters}
+        )
+    else:
+        statement = sqlite.insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + statement.excluded[column] for column in counters}
+        )
+    db.execute(statement)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_on_commit(session: Session):
+    # Savepoint commits fire this too; the deltas wait for the outer commit
+    if PENDING_KEY in session.info and not session.in_nested_transaction():
+        write_pending(session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction):
+    # Rolled back: the deltas go with the appointment changes they describe
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+# =============== READING ===============
+
+def aggregate(
+    db: Session,
+    start_day: date,
+    end_day: date,
+    barber_id: Optional[int] = None
+) -> Dict[DayKey, dict]:
+    """Per (barber, day) stats computed from the appointments table"""
+    range_start = datetime.combine(start_day, datetime.min.time())
+    range_end = datetime.combine(end_day, datetime.max.time())
+
+    # Prices and names are snapshotted on the appointment: no joins needed
+    barber_col = func.coalesce(models.Appointment.barber_id, NO_BARBER).label("barber_id")
+    day_col = func.date(models.Appointment.start_time).label("day")
+
+    def appointments_in_range(*columns):
+        query = db.query(*columns).filter(
+            models.Appointment.start_time >= range_start,
+            models.Appointment.start_time <= range_end
+        )
+        if barber_id:
+            query = query.filter(models.Appointment.barber_id == barber_id)
+        return query
+
+    daily_rows = appointments_in_range(
+        barber_col, day_col, models.Appointment.status,
+        func.count(models.Appointment.id), func.sum(models.Appointment.price_cents)
+    ).group_by(barber_col, day_col, models.Appointment.status).all()
+
+    service_rows = appointments_in_range(
+        barber_col, day_col, models.Appointment.service_name, func.count(models.Appointment.id)
+    ).filter(
+        models.Appointment.status.notin_(CANCELLED_STATUSES),
+        models.Appointment.service_name.isnot(None)
+    ).group_by(barber_col, day_col, models.Appointment.service_name).all()
+
+    days: Dict[DayKey, dict] = {}
+    for row_barber_id, day, status, count, revenue_cents in daily_rows:
+        data = days.setdefault((row_barber_id, _as_date(day)), empty_day())
+        if status in CANCELLED_STATUSES:
+            data["cancelled"] += count
+            continue
+        data["active"] += count
+        if status in BOOKED_STATUSES:
+            data["booked"] += count
+        data["revenue_cents"] += int(revenue_cents or 0)
+
+    for row_barber_id, day, name, count in service_rows:
+        services = days.setdefault((row_barber_id, _as_date(day)), empty_day())["services"]
+        services[name] = count
+    return days
+
+
+def read_rollup(
+    db: Session,
+    start_day: date,
+    end_day: date,
+    barber_id: Optional[int] = None
+) -> Dict[DayKey, dict]:
+    """Per (barber, day) stats from the rollup tables (no "booked" count)"""
+    days: Dict[DayKey, dict] = {}
+    if end_day < start_day:
+        return days
+
+    stats_query = db.query(models.DailyBarberStat).filter(
+        models.DailyBarberStat.day >= start_day,
+        models.DailyBarberStat.day <= end_day
+    )
+    services_query = db.query(
+        models.DailyBarberServiceStat.barber_id,
+        models.DailyBarberServiceStat.day,
+        models.DailyBarberServiceStat.service_name,
+        models.DailyBarberServiceStat.count
+    ).filter(
+        models.DailyBarberServiceStat.day >= start_day,
+        models.DailyBarberServiceStat.day <= end_day,
+        models.DailyBarberServiceStat.count > 0
+    )
+    if barber_id:
+        stats_query = stats_query.filter(models.DailyBarberStat.barber_id == barber_id)
+        services_query = services_query.filter(models.DailyBarberServiceStat.barber_id == barber_id)
+
+    for row in stats_query.all():
+        data = days.setdefault((row.barber_id, row.day), empty_day())
+        data["active"] = row.active_count
+        data["cancelled"] = row.cancelled_count
+        data["revenue_cents"] = row.revenue_cents
+    for row_barber_id, day, name, count in services_query.all():
+        days.setdefault((row_barber_id, day), empty_day())["services"][name] = count
+    return days
+
+
+def rebuild(db: Session, start_day: date, end_day: date) -> int:
+    """Recompute the rollup for [start_day, end_day] from appointments; returns days written"""
+    for model in (models.DailyBarberStat, models.DailyBarberServiceStat):
+        db.query(model).filter(model.day >= start_day, model.day <= end_day).delete(
+            synchronize_session=False
+        )
+    days = aggregate(db, start_day, end_day)
+    db.add_all(
+        models.DailyBarberStat(
+            barber_id=barber_id, day=day, active_count=data["active"],
+            cancelled_count=data["cancelled"], revenue_cents=data["revenue_cents"]
+        )
+        for (barber_id, day), data in days.items()
+    )
+    db.add_all(
+        models.DailyBarberServiceStat(barber_id=barber_id, day=day, service_name=name, count=count)
+        for (barber_id, day), data in days.items()
+        for name, count in data["services"].items()
+    )
+    db.commit()
+    return len(days)
+
+
+def _as_date(value) -> date:
+    # SQLite returns the day as a string, MySQL as a date
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
@@ -0,0 +1,156 @@
+"""
+Shared fixtures: the app runs against a throwaway SQLite database.
+
+Run from the repository root (main.py mounts ./static and ./templates):
+    python -m pytest -q
+TEST_DATABASE_URL points the suite at another database instead.
+"""
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+# Before anything imports database.py, which reads DATABASE_URL at import time
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["BCRYPT_ROUNDS"] = "4"  # cheapest cost: the suite checks logins, not bcrypt
+os.environ["LOGIN_LIMITER_BACKEND"] = "memory"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
+import models
+
+ADMIN_USERNAME = "admin"
+CUSTOMER_PHONE = "11977776666"
+PASSWORD = "segredo123"
+
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    """Empty tables and caches for every test"""
+    import availability
+    from routers import auth
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    availability.slot_cache.clear()
+    auth.principal_cache.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def admin_headers(client, db):
+    from routers.auth import get_password_hash
+    db.add(models.User(username=ADMIN_USERNAME, hashed_password=get_password_hash(PASSWORD), is_admin=True))
+    db.commit()
+    response = client.post("/auth/login", data={"username": ADMIN_USERNAME, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    client.cookies.clear()
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+@pytest.fixture
+def customer_token(client):
+    response = client.post("/customer/register", json={
+        "name": "Cliente", "phone": CUSTOMER_PHONE, "password": PASSWORD
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def statements_on_loop():
+    """Statements run on an event loop thread (async endpoints must use the threadpool)"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # a worker thread: fine
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(database.engine, "before_cursor_execute", record)
+
+
+# =============== HELPERS ===============
+
+@pytest.fixture
+def make_barber(db):
+    """Factory: a barber working 09:00-18:00 with a 30-minute service; returns (barber_id, service_id)"""
+    def make(name: str = "Barbeiro"):
+        barber = models.Barber(name=name, start_time="09:00", end_time="18:00")
+        db.add(barber)
+        db.flush()
+        service = models.BarberService(barber_id=barber.id, name="Corte", duration_minutes=30, price=30.0)
+        db.add(service)
+        db.commit()
+        return barber.id, service.id
+    return make
+
+
+@pytest.fixture
+def book_slot():
+    """Factory: run the real booking endpoint with its own session; returns the HTTP status"""
+    from fastapi import HTTPException
+    import schemas
+    from routers.user import book_appointment
+
+    def book(barber_id: int, service_id: int, start_time: datetime) -> int:
+        session = database.SessionLocal()
+        try:
+            book_appointment(schemas.AppointmentCreate(
+                customer_name="Cliente",
+                customer_phone="11999990000",
+                barber_id=barber_id,
+                barber_service_id=service_id,
+                start_time=start_time
+            ), None, session)
+            return 200
+        except HTTPException as e:
+            return e.status_code
+        finally:
+            session.close()
+    return book
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting the statements run inside it; fails beyond max_queries"""
+    @contextmanager
+    def count(max_queries=None, label="block"):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            # SQLite's explicit BEGIN (see database.py) has no counterpart on MySQL
+            if not statement.startswith("BEGIN"):
+                statements.append(" ".join(statement.split()))
+
+        event.listen(database.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(database.engine, "before_cursor_execute", record)
+        if max_queries is not None and len(statements) > max_queries:
+            listing = "\n  ".join(s[:120] for s in statements)
+            raise AssertionError(f"{label}: {len(statements)} statements, budget {max_queries}:\n  {listing}")
+    return count
@@ -0,0 +1,21 @@
+import database
+from routers import auth
+
+
+def test_cached_token_resolves_without_queries(admin_headers, count_queries):
+    token = admin_headers["Authorization"].split()[1]
+
+    def resolve():
+        db = database.SessionLocal()
+        try:
+            return auth.get_current_admin_user(auth.get_current_user(token, db))
+        finally:
+            db.close()
+
+    auth.principal_cache.clear()
+    with count_queries() as cold:
+        principal = resolve()
+    with count_queries() as warm:
+        assert resolve().id == principal.id
+    assert len(cold) == 1
+    assert warm == []
@@ -0,0 +1,28 @@
+from datetime import date, datetime, timedelta
+
+import availability
+import models
+
+
+def test_range_matches_the_single_day_endpoint(client, db, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    barber = db.get(models.Barber, barber_id)
+    barber.start_interval, barber.end_interval = "12:00", "13:00"
+    db.commit()
+    first = date.today() + timedelta(days=1)
+    for offset, hour in ((0, 9), (0, 15), (2, 10), (4, 17)):
+        start = datetime.combine(first + timedelta(days=offset), datetime.min.time()).replace(hour=hour)
+        assert book_slot(barber_id, service_id, start) == 200
+
+    query = f"barber_id={barber_id}&barber_service_id={service_id}"
+    response = client.get(f"/availability/range?start_date={first}&days=5&{query}")
+    assert response.status_code == 200, response.text
+    days = response.json()["days"]
+    assert [d["date"] for d in days] == [(first + timedelta(days=i)).isoformat() for i in range(5)]
+
+    for day in days:
+        availability.slot_cache.clear()  # computed on its own, not read back from the range
+        single = client.get(f"/availability?date_str={day['date']}&{query}").json()["slots"]
+        assert day["slots"] == single
+    assert "09:00" not in days[0]["slots"] and "12:00" not in days[0]["slots"]
+    assert "09:00" in days[1]["slots"]
@@ -0,0 +1,43 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import availability_stream
+
+
+async def next_event(subscription):
+    return await asyncio.wait_for(subscription.queue.get(), 5)
+
+
+def apply(slots, event, data):
+    """What a client does with each message"""
+    if event == "slots":
+        return list(data["slots"])
+    return sorted((set(slots) - set(data["removed"])) | set(data["added"]))
+
+
+def test_booking_during_subscription_setup_reaches_the_client(make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    day = date.today() + timedelta(days=1)
+    slot = datetime.combine(day, datetime.min.time()).replace(hour=10)
+
+    async def scenario():
+        key = availability_stream.subscription_key(barber_id, day, service_id)
+        subscription = availability_stream.broadcaster.subscribe(key)
+        try:
+            # The snapshot is read, then a booking commits before it is recorded
+            slots = availability_stream.compute_slots([key])[key]
+            assert "10:00" in slots
+            assert book_slot(barber_id, service_id, slot) == 200
+            event = await next_event(subscription)
+            subscription.snapshot(slots)
+            slots = apply(slots, *event)
+            assert "10:00" not in slots
+
+            # And one after the snapshot arrives as a diff
+            assert book_slot(barber_id, service_id, slot.replace(hour=11)) == 200
+            event, data = await next_event(subscription)
+            assert event == "diff" and data["removed"] == ["11:00"]
+        finally:
+            availability_stream.broadcaster.unsubscribe(key, subscription)
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+
+import models
+from conftest import CUSTOMER_PHONE
+
+
+def next_week_at(hour: int, minute: int = 0) -> datetime:
+    day = datetime.combine(date.today() + timedelta(days=7), datetime.min.time())
+    return day.replace(hour=hour, minute=minute)
+
+
+def batch(client, barber_id, service_id, start, **fields):
+    return client.post("/book/batch", json={
+        "customer_name": "Cliente", "customer_phone": CUSTOMER_PHONE,
+        "barber_id": barber_id, "barber_service_id": service_id,
+        "start_time": start.isoformat(), **fields
+    })
+
+
+def booked_starts(db):
+    db.expire_all()
+    return sorted(start for (start,) in db.query(models.Appointment.start_time))
+
+
+def test_recurrence_books_every_occurrence(client, db, make_barber):
+    barber_id, service_id = make_barber()
+    start = next_week_at(10)
+    response = batch(client, barber_id, service_id, start, recurrence={"every_weeks": 2, "count": 4})
+
+    assert response.status_code == 200, response.text
+    expected = [start + timedelta(weeks=2 * i) for i in range(4)]
+    assert response.json()["booked"] == 4
+    assert [r["start_time"] for r in response.json()["results"]] == [s.isoformat() for s in expected]
+    assert booked_starts(db) == expected
+
+
+def test_items_are_booked_back_to_back(client, db, make_barber):
+    barber_id, service_id = make_barber()
+    start = next_week_at(10)
+    response = batch(client, barber_id, service_id, start, items=[{}, {"customer_name": "Filho"}, {}])
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["booked"] * 3
+    assert [r["appointment"]["customer_name"] for r in results] == ["Cliente", "Filho", "Cliente"]
+    assert booked_starts(db) == [start + timedelta(minutes=30 * i) for i in range(3)]
+
+
+def test_any_taken_slot_rejects_the_whole_batch(client, db, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    start = next_week_at(10)
+    taken = start + timedelta(weeks=1)
+    assert book_slot(barber_id, service_id, taken) == 200
+
+    response = batch(client, barber_id, service_id, start, recurrence={"every_weeks": 1, "count": 3})
+
+    assert response.status_code == 409
+    assert taken.strftime("%d/%m %H:%M") in response.json()["detail"]
+    assert booked_starts(db) == [taken]  # nothing else was written
+
+
+def test_allow_partial_books_the_free_slots(client, db, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    start = next_week_at(10)
+    assert book_slot(barber_id, service_id, start.replace(minute=30)) == 200
+
+    response = batch(client, barber_id, service_id, start, items=[{}, {}, {}], allow_partial=True)
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["booked"] == 2
+    assert [r["status"] for r in body["results"]] == ["booked", "conflict", "booked"]
+    assert body["results"][1]["appointment"] is None
+    assert booked_starts(db) == [start + timedelta(minutes=30 * i) for i in range(3)]
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import models
+
+# Parallel clients per scenario; set BOOKING_STRESS_CLIENTS to run a larger stress
+BOOKING_STRESS_CLIENTS = int(os.getenv("BOOKING_STRESS_CLIENTS", "200"))
+
+
+def tomorrow_at(hour: int) -> datetime:
+    return datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).replace(hour=hour)
+
+
+def test_parallel_bookings_of_one_slot_have_one_winner(make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    slot = tomorrow_at(10)
+    with ThreadPoolExecutor(max_workers=BOOKING_STRESS_CLIENTS) as pool:
+        statuses = list(pool.map(lambda _: book_slot(barber_id, service_id, slot), range(BOOKING_STRESS_CLIENTS)))
+    assert statuses.count(200) == 1
+    assert statuses.count(409) == len(statuses) - 1
+
+
+def test_parallel_bookings_of_distinct_slots_all_succeed(make_barber, book_slot):
+    barbers = [make_barber(f"Barbeiro {i}") for i in range(4)]
+    jobs = [
+        (*barbers[i % len(barbers)], tomorrow_at(11) + timedelta(days=i // len(barbers)))
+        for i in range(BOOKING_STRESS_CLIENTS)
+    ]
+    with ThreadPoolExecutor(max_workers=min(BOOKING_STRESS_CLIENTS, 32)) as pool:
+        statuses = list(pool.map(lambda job: book_slot(*job), jobs))
+    assert statuses == [200] * len(jobs)
+
+
+def test_timezone_aware_start_times_book_the_local_slot(client, db, customer_token, make_barber):
+    barber_id, service_id = make_barber()
+    booking = {
+        "customer_name": "Cliente", "customer_phone": "11977776666",
+        "barber_id": barber_id, "barber_service_id": service_id
+    }
+
+    def aware(local: datetime, hours: int) -> str:
+        return local.astimezone().astimezone(timezone(timedelta(hours=hours))).isoformat()
+
+    response = client.post(f"/book?customer_token={customer_token}", json={
+        **booking, "start_time": aware(tomorrow_at(9), -3)
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["start_time"] == tomorrow_at(9).isoformat()
+
+    response = client.post("/book/batch", json={
+        **booking, "start_time": aware(tomorrow_at(10), 0), "items": [{}, {}]
+    })
+    assert response.status_code == 200, response.text
+    assert [r["start_time"] for r in response.json()["results"]] == \
+        [tomorrow_at(10).isoformat(), tomorrow_at(10).replace(minute=30).isoformat()]
+
+    appointment_id = db.query(models.Appointment.id).filter(models.Appointment.customer_id.isnot(None)).scalar()
+    response = client.post(
+        f"/customer/appointments/{appointment_id}/reschedule?token={customer_token}",
+        json={"start_time": aware(tomorrow_at(14), 2)}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["start_time"] == tomorrow_at(14).isoformat()
+
+
+def test_conflict_keeps_a_string_detail_and_offers_bookable_alternatives(client, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    slot = tomorrow_at(10)
+    assert book_slot(barber_id, service_id, slot) == 200
+
+    booking = {
+        "customer_name": "Cliente", "customer_phone": "11977776666",
+        "barber_id": barber_id, "barber_service_id": service_id
+    }
+    response = client.post("/book", json={**booking, "start_time": slot.isoformat()})
+
+    assert response.status_code == 409
+    body = response.json()
+    assert isinstance(body["detail"], str)
+    assert body["alternatives"]
+    for alternative in body["alternatives"]:
+        assert alternative["time"] == alternative["start_time"][11:16]
+        booked = client.post("/book", json={**booking, "start_time": alternative["start_time"]})
+        assert booked.status_code == 200, booked.text
@@ -0,0 +1,25 @@
+from datetime import date, datetime, timedelta, timezone
+
+
+
+def earliest(client, start, end):
+    response = client.get("/availability/earliest", params={
+        "duration_minutes": 30, "start": start.isoformat(), "end": end.isoformat()
+    })
+    assert response.status_code == 200, response.text
+    return [slot["start_time"] for slot in response.json()["slots"]]
+
+
+def test_timezone_aware_window_is_read_as_local_time(client, make_barber):
+    make_barber()
+    start = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    end = start + timedelta(days=2)
+    expected = earliest(client, start, end)
+    assert expected
+
+    # The same instants written in another offset, alone and mixed with a naive bound
+    offset = timezone(timedelta(hours=5))
+    aware_start = start.astimezone().astimezone(offset)
+    aware_end = end.astimezone().astimezone(offset)
+    assert earliest(client, aware_start, aware_end) == expected
+    assert earliest(client, aware_start, end) == expected
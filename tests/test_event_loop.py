@@ -0,0 +1,14 @@
+"""Async endpoints must not run blocking SQL on the event loop thread."""
+from conftest import CUSTOMER_PHONE, PASSWORD
+
+
+def test_auth_endpoints_run_queries_in_the_threadpool(client, statements_on_loop):
+    responses = [
+        client.post("/auth/init-admin"),
+        client.post("/auth/login", data={"username": "admin", "password": "wrong"}),
+        client.post("/auth/login", data={"username": "admin", "password": "admin123"}),
+        client.post("/customer/register", json={"name": "Cliente", "phone": CUSTOMER_PHONE, "password": PASSWORD}),
+        client.post("/customer/login", json={"phone": CUSTOMER_PHONE, "password": PASSWORD}),
+    ]
+    assert [response.status_code for response in responses] == [200, 401, 200, 200, 200]
+    assert statements_on_loop == []
@@ -0,0 +1,75 @@
+import os
+import time
+
+import bcrypt
+import pytest
+
+import hashing
+import models
+from conftest import ADMIN_USERNAME, PASSWORD
+
+
+def stored_hash(db):
+    db.expire_all()
+    return db.query(models.User).filter(models.User.username == ADMIN_USERNAME).one().hashed_password
+
+
+@pytest.fixture
+def admin_with_cost(db):
+    def create(rounds):
+        hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+        db.add(models.User(username=ADMIN_USERNAME, hashed_password=hashed, is_admin=True))
+        db.commit()
+        return hashed
+    return create
+
+
+def login(client):
+    response = client.post("/auth/login", data={"username": ADMIN_USERNAME, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+
+
+def test_pinned_cost_moves_hashes_both_ways(client, db, admin_with_cost, statements_on_loop):
+    admin_with_cost(5)  # the suite pins BCRYPT_ROUNDS=4
+    login(client)
+    assert hashing.hash_rounds(stored_hash(db)) == 4
+    assert statements_on_loop == []
+
+
+def test_calibrated_cost_only_upgrades(client, db, admin_with_cost, monkeypatch):
+    monkeypatch.setattr(hashing, "BCRYPT_ROUNDS", 0)
+    monkeypatch.setattr(hashing, "_rounds", 5)
+    original = admin_with_cost(6)
+    login(client)
+    assert stored_hash(db) == original
+
+    monkeypatch.setattr(hashing, "_rounds", 7)
+    login(client)
+    assert hashing.hash_rounds(stored_hash(db)) == 7
+    assert bcrypt.checkpw(PASSWORD.encode(), stored_hash(db).encode())
+
+
+def test_calibrated_cost_is_shared_through_the_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "bcrypt_rounds")
+    monkeypatch.setattr(hashing, "calibrate_rounds", lambda *args: 11)
+    assert hashing._calibrated_rounds(path) == 11
+    # Another worker measuring differently still uses the saved cost
+    monkeypatch.setattr(hashing, "calibrate_rounds", lambda *args: 12)
+    assert hashing._calibrated_rounds(path) == 11
+
+
+def test_saved_cost_is_recalibrated_when_stale_or_from_another_host(tmp_path, monkeypatch):
+    path = str(tmp_path / "bcrypt_rounds")
+    monkeypatch.setattr(hashing, "calibrate_rounds", lambda *args: 11)
+    assert hashing._calibrated_rounds(path) == 11
+    monkeypatch.setattr(hashing, "calibrate_rounds", lambda *args: 12)
+
+    # A later startup on the same host measures again
+    old = time.time() - hashing.BCRYPT_CALIBRATION_MAX_AGE - 1
+    os.utime(path, (old, old))
+    assert hashing._calibrated_rounds(path) == 12
+
+    # So does one on different hardware sharing the data directory
+    with open(path, "w") as f:
+        f.write("11 another-host")
+    assert hashing._calibrated_rounds(path) == 12
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+import models
+from conftest import CUSTOMER_PHONE
+from pagination import NEXT_CURSOR_HEADER
+
+TODAY = date.today().isoformat()
+
+
+def add_appointments(db, barber_id, service_id, count, customer_id=None):
+    """`count` appointments today, two per start time so pages split ties"""
+    day = datetime.combine(date.today(), datetime.min.time())
+    appointments = [
+        models.Appointment(
+            customer_name="Cliente", customer_phone=CUSTOMER_PHONE, customer_id=customer_id,
+            barber_id=barber_id, barber_service_id=service_id, status="scheduled",
+            start_time=day + timedelta(hours=9, minutes=30 * (i // 2)),
+            end_time=day + timedelta(hours=9, minutes=30 * (i // 2) + 30)
+        )
+        for i in range(count)
+    ]
+    db.add_all(appointments)
+    db.commit()
+    return [appointment.id for appointment in appointments]
+
+
+def test_panel_pages_follow_the_cursor(client, db, admin_headers, make_barber):
+    ids = add_appointments(db, *make_barber(), 7)
+    seen, cursor = [], None
+    for _ in range(3):
+        url = f"/panel/appointments?date_filter={TODAY}&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        seen.extend(appointment["id"] for appointment in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    assert seen == ids
+    assert cursor is None  # the last page has no next cursor
+
+
+def test_customer_history_pages_newest_first(client, db, customer_token, make_barber):
+    customer_id = db.query(models.Customer.id).scalar()
+    ids = add_appointments(db, *make_barber(), 5, customer_id)
+    first = client.get(f"/customer/history?token={customer_token}&limit=3")
+    second = client.get(
+        f"/customer/history?token={customer_token}&cursor={first.headers[NEXT_CURSOR_HEADER]}"
+    )
+    assert [a["id"] for a in first.json() + second.json()] == sorted(ids, reverse=True)
+    assert NEXT_CURSOR_HEADER not in second.headers
+
+
+def test_invalid_cursor_is_rejected(client, admin_headers):
+    response = client.get("/panel/appointments?cursor=not-a-cursor", headers=admin_headers)
+    assert response.status_code == 400
+
+
+def test_skip_still_pages_without_a_cursor(client, db, admin_headers, make_barber):
+    ids = add_appointments(db, *make_barber(), 5)
+    response = client.get(f"/panel/appointments?date_filter={TODAY}&skip=2&limit=2", headers=admin_headers)
+    assert [appointment["id"] for appointment in response.json()] == ids[2:4]
+
+
+def test_zero_limit_returns_an_empty_page(client, db, admin_headers, make_barber):
+    add_appointments(db, *make_barber(), 2)
+    response = client.get(f"/panel/appointments?date_filter={TODAY}&limit=0", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+    assert NEXT_CURSOR_HEADER not in response.headers
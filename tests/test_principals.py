@@ -0,0 +1,30 @@
+import database
+import models
+from conftest import PASSWORD
+from routers.auth import get_password_hash
+
+
+def insert_without_events(model, **values):
+    """As a database created before the principals index has its accounts"""
+    with database.engine.begin() as conn:
+        conn.execute(model.__table__.insert().values(**values))
+
+
+def login(client, username):
+    return client.post("/auth/login", data={"username": username, "password": PASSWORD}).status_code
+
+
+def test_startup_indexes_accounts_that_predate_the_principals_table(client):
+    hashed = get_password_hash(PASSWORD)
+    insert_without_events(models.User, username="antigo", hashed_password=hashed, is_admin=True)
+    insert_without_events(models.Barber, name="Barbeiro", username="barbeiro", hashed_password=hashed)
+    insert_without_events(models.Barber, name="Duplicado", username="antigo", hashed_password=hashed)
+    assert login(client, "antigo") == 401
+
+    added, conflicts = models.index_missing_principals(database.engine)
+    assert added == 2
+    assert len(conflicts) == 1 and conflicts[0].startswith("barber")
+    assert login(client, "antigo") == 200
+    assert login(client, "barbeiro") == 200
+    # Running again (every startup, or another worker) changes nothing
+    assert models.index_missing_principals(database.engine) == (0, conflicts)
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import Counter
+
+import profiling
+
+
+def scope_with(headers=(), query_string=b""):
+    return {"type": "http", "headers": list(headers), "query_string": query_string}
+
+
+def test_profile_header_needs_a_truthy_value():
+    assert profiling._wants_profile(scope_with([(b"x-profile", b"1")]))
+    assert profiling._wants_profile(scope_with([(b"x-profile", b"True")]))
+    assert not profiling._wants_profile(scope_with([(b"x-profile", b"0")]))
+    assert not profiling._wants_profile(scope_with([(b"x-profile", b"false")]))
+    assert not profiling._wants_profile(scope_with())
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 3)
+    names = [f"2026010{i}T000000000000_GET_x{profiling.PROFILE_SUFFIX}" for i in range(1, 6)]
+    for name in names:
+        profiling._save(name, Counter({"a;b": 1}))
+
+    assert sorted(os.listdir(tmp_path)) == names[-3:]
+
+
+def test_pooled_thread_stops_counting_once_it_serves_another_request(db):
+    from contextvars import Context
+    from sqlalchemy import text
+    import database
+
+    threads = set()
+    sampler = profiling.StackSampler(threads, 0.001, -1, None)
+    ident = threading.get_ident()
+    with database.watch_threads(threads):
+        db.execute(text("SELECT 1"))
+        assert sampler._is_ours(ident, None)
+        # The same thread now runs another (unprofiled) request's SQL
+        Context().run(db.execute, text("SELECT 1"))
+        assert not sampler._is_ours(ident, None)
+
+
+def test_thread_owners_stay_empty_outside_profiled_requests(db):
+    from sqlalchemy import text
+    import database
+
+    db.execute(text("SELECT 1"))
+    assert database._thread_owners == {}
+
+    threads = set()
+    with database.watch_threads(threads):
+        db.execute(text("SELECT 1"))
+        assert database.thread_owner(threading.get_ident()) is threads
+    assert database._thread_owners == {}
@@ -0,0 +1,95 @@
+"""Each endpoint runs a fixed number of statements, whatever the number of rows."""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import database
+import models
+import stats
+from conftest import CUSTOMER_PHONE
+
+# Most statements each endpoint may run, whatever the number of rows it returns.
+# Panel budgets include the token lookup made when the principal cache is cold.
+QUERY_BUDGETS = {
+    "GET /barbers": 2,
+    "GET /panel/barbers": 3,
+    "GET /panel/appointments": 2,
+    "GET /customer/history": 2,
+    "GET /stories": 1,
+    "GET /stories/recent": 1,
+    "GET /stories/barber/{id}": 2,
+    "GET /panel/dashboard-stats": 6,
+    # First booking of a day included, BEGIN/COMMIT aside
+    "POST /book": 5,
+}
+
+
+def seed_rows(rows: int, customer_id: int):
+    """Add `rows` barbers with 3 services, one appointment today with a story each"""
+    rng = random.Random(rows)
+    db = database.SessionLocal()
+    try:
+        today = datetime.combine(date.today(), datetime.min.time())
+        for i in range(rows):
+            barber = models.Barber(name=f"Barbeiro {rng.random():.6f}", start_time="09:00", end_time="18:00")
+            barber.services = [
+                models.BarberService(name=name, duration_minutes=30, price=price)
+                for name, price in (("Corte", 30.0), ("Barba", 20.0), ("Combo", 45.0))
+            ]
+            db.add(barber)
+            db.flush()
+            start = today + timedelta(hours=9, minutes=rng.randint(0, 16) * 30)
+            appointment = models.Appointment(
+                customer_name="Cliente", customer_phone=CUSTOMER_PHONE, customer_id=customer_id,
+                barber_id=barber.id, barber_service_id=barber.services[i % 3].id,
+                start_time=start, end_time=start + timedelta(minutes=30), status="completed",
+                **stats.service_snapshot(barber_service=barber.services[i % 3])
+            )
+            appointment.media = [models.AppointmentMedia(media_url=f"/static/uploads/{i}.jpg")]
+            db.add(appointment)
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def urls(customer_token):
+    return {
+        "GET /barbers": "/barbers",
+        "GET /panel/barbers": "/panel/barbers",
+        "GET /panel/appointments": f"/panel/appointments?date_filter={date.today()}",
+        "GET /customer/history": f"/customer/history?token={customer_token}",
+        "GET /stories": "/stories",
+        "GET /stories/recent": "/stories/recent",
+        "GET /stories/barber/{id}": "/stories/barber/1",
+        "GET /panel/dashboard-stats": "/panel/dashboard-stats",
+    }
+
+
+def test_endpoints_stay_within_their_query_budget(client, db, admin_headers, urls, count_queries):
+    customer_id = db.query(models.Customer.id).scalar()
+    rows = 10
+    # Same budget at N and 2N rows: the count must not depend on the data size
+    for total in (rows, rows * 2):
+        seed_rows(rows, customer_id)
+        for label, url in urls.items():
+            with count_queries(QUERY_BUDGETS[label], f"{label} ({total} rows)"):
+                response = client.get(url, headers=admin_headers)
+            assert response.status_code == 200, f"{label}: {response.status_code} {response.text}"
+
+
+def test_booking_stays_within_its_query_budget(client, customer_token, make_barber, count_queries):
+    barber_id, service_id = make_barber()
+    day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    # The first booking of a day creates its rollup rows, the next ones update them
+    for hour in (9, 10, 11):
+        with count_queries(QUERY_BUDGETS["POST /book"], f"POST /book at {hour}h"):
+            response = client.post(f"/book?customer_token={customer_token}", json={
+                "customer_name": "Cliente",
+                "customer_phone": CUSTOMER_PHONE,
+                "barber_id": barber_id,
+                "barber_service_id": service_id,
+                "start_time": day.replace(hour=hour).isoformat()
+            })
+        assert response.status_code == 200, response.text
@@ -0,0 +1,128 @@
+"""Every query the hot endpoints run on appointments tables must use an index."""
+import random
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+import database
+import models
+import stats
+from conftest import CUSTOMER_PHONE
+from pagination import NEXT_CURSOR_HEADER
+
+HOT_TABLES = ("appointments", "appointment_media")
+HOT_QUERY = re.compile(r"\b(?:FROM|JOIN)\s+(?:appointments|appointment_media)\b", re.IGNORECASE)
+
+
+def full_scans(conn, statement, parameters):
+    """Plan steps that read a hot table without an index lookup.
+
+    Walking an index in order is fine when the query has a LIMIT: it stops
+    after the page (first page of an unfiltered listing).
+    """
+    limited = re.search(r"\bLIMIT\b", statement, re.IGNORECASE) is not None
+    if conn.dialect.name == "sqlite":
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        return [
+            row[-1] for row in plan
+            if re.match(rf"SCAN ({'|'.join(HOT_TABLES)})\b", row[-1])
+            and not (limited and "USING" in row[-1])
+        ]
+    plan = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+    return [
+        f"{row['table']}: type={row['type']} key={row['key']}" for row in plan
+        if row["table"] in HOT_TABLES
+        and (row["key"] is None or row["type"] == "ALL" or (row["type"] == "index" and not limited))
+    ]
+
+
+def seed_appointments(db, barbers, customer_id: int, count: int):
+    rng = random.Random(42)
+    today = date.today()
+    services = {service.barber_id: service for service in db.query(models.BarberService).all()}
+    appointments = []
+    for i in range(count):
+        barber_id, _ = rng.choice(barbers)
+        start = datetime.combine(today + timedelta(days=rng.randint(-180, 30)), datetime.min.time())
+        start += timedelta(hours=rng.randint(9, 17), minutes=rng.choice([0, 30]))
+        appointments.append(models.Appointment(
+            customer_name="Cliente", customer_phone=CUSTOMER_PHONE,
+            customer_id=customer_id if i % 10 == 0 else None,
+            barber_id=barber_id, barber_service_id=services[barber_id].id,
+            start_time=start, end_time=start + timedelta(minutes=30),
+            status=rng.choice(["scheduled", "completed", "completed", "cancelled", "no_show"]),
+            **stats.service_snapshot(barber_service=services[barber_id])
+        ))
+    db.add_all(appointments)
+    db.flush()
+    db.add_all(
+        models.AppointmentMedia(
+            appointment_id=appointment.id, media_url=f"/static/uploads/{appointment.id}.jpg",
+            created_at=datetime.utcnow() - timedelta(days=rng.randint(0, 60))
+        )
+        for appointment in appointments[::20]
+    )
+    db.commit()
+    stats.rebuild(db, today - timedelta(days=180), today + timedelta(days=30))
+
+
+def test_hot_queries_use_an_index(client, db, admin_headers, customer_token, make_barber):
+    barbers = [make_barber(f"Barbeiro {i}") for i in range(4)]
+    customer_id = db.query(models.Customer.id).scalar()
+    seed_appointments(db, barbers, customer_id, 1500)
+
+    statements = {}
+    label = None
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT") and HOT_QUERY.search(statement):
+            statements.setdefault(statement, (label, parameters))
+
+    barber_id, service_id = barbers[0]
+    day = date.today() + timedelta(days=3)
+    token = customer_token
+    requests = [
+        ("availability", f"/availability?date_str={day}&barber_id={barber_id}&barber_service_id={service_id}"),
+        ("availability range", f"/availability/range?start_date={day}&barber_id={barber_id}&days=7"),
+        ("book", f"/book?customer_token={token}"),
+        ("panel appointments", f"/panel/appointments?date_filter={day}"),
+        ("panel appointments by barber", f"/panel/appointments?date_filter={day}&barber_id={barber_id}"),
+        ("dashboard", "/panel/dashboard-stats"),
+        ("dashboard by barber", f"/panel/dashboard-stats?barber_id={barber_id}"),
+        ("customer history", f"/customer/history?token={token}"),
+        ("stories", "/stories"),
+        ("recent stories", "/stories/recent"),
+        ("barber stories", f"/stories/barber/{barber_id}"),
+    ]
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        for label, url in requests:
+            if url.startswith("/book"):
+                response = client.post(url, json={
+                    "customer_name": "Cliente", "customer_phone": CUSTOMER_PHONE, "barber_id": barber_id,
+                    "barber_service_id": service_id,
+                    "start_time": (datetime.combine(day, datetime.min.time()) + timedelta(hours=8)).isoformat()
+                })
+            else:
+                response = client.get(url, headers=admin_headers)
+            assert response.status_code == 200, f"{label}: {response.status_code} {response.text}"
+        # Later pages of the cursor-paginated listings
+        for label, url in (
+            ("panel appointments next page", "/panel/appointments?limit=50"),
+            ("customer history next page", f"/customer/history?token={token}&limit=20"),
+        ):
+            cursor = client.get(url, headers=admin_headers).headers[NEXT_CURSOR_HEADER]
+            response = client.get(f"{url}&cursor={cursor}", headers=admin_headers)
+            assert response.status_code == 200, f"{label}: {response.status_code} {response.text}"
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+
+    assert statements
+    with database.engine.connect() as conn:
+        failures = {
+            f"{label}: {' '.join(statement.split())[:120]}": scans
+            for statement, (label, parameters) in statements.items()
+            if (scans := full_scans(conn, statement, parameters))
+        }
+    assert not failures
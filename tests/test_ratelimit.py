@@ -0,0 +1,36 @@
+import pytest
+
+from ratelimit import LoginLimiter, MemoryLoginLimiter
+
+DELAYS = [0, 0, 60]
+
+
+def test_limiter_backends_must_implement_every_method():
+    class Partial(LoginLimiter):
+        def check(self, identifier):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial(DELAYS, 900)
+
+
+def test_full_limiter_never_evicts_an_active_lockout():
+    limiter = MemoryLoginLimiter(DELAYS, 900, max_entries=3)
+    for _ in range(2):
+        limiter.record_failure("locked")
+    assert limiter.check("locked")
+
+    for i in range(10):
+        limiter.record_failure(f"other-{i}")
+
+    assert limiter.check("locked")
+    assert len(limiter._entries) <= 3
+
+
+def test_full_limiter_evicts_the_oldest_unlocked_entry():
+    limiter = MemoryLoginLimiter(DELAYS, 900, max_entries=2)
+    limiter.record_failure("first")
+    limiter.record_failure("second")
+    limiter.record_failure("third")
+
+    assert list(limiter._entries) == ["second", "third"]
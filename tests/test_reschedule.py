@@ -0,0 +1,35 @@
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import models
+from conftest import CUSTOMER_PHONE
+
+
+def test_parallel_reschedules_into_one_slot_have_one_winner(client, db, customer_token, make_barber):
+    barber_id, service_id = make_barber()
+    customer_id = db.query(models.Customer.id).scalar()
+    day = datetime.combine(date.today() + timedelta(days=2), datetime.min.time())
+    appointments = [
+        models.Appointment(
+            customer_name="Cliente", customer_phone=CUSTOMER_PHONE, customer_id=customer_id,
+            barber_id=barber_id, barber_service_id=service_id, status="scheduled",
+            start_time=day.replace(hour=9 + i), end_time=day.replace(hour=9 + i, minute=30)
+        )
+        for i in range(2)
+    ]
+    db.add_all(appointments)
+    db.commit()
+    target = day.replace(hour=15).isoformat()
+
+    def reschedule(appointment_id):
+        return client.post(
+            f"/customer/appointments/{appointment_id}/reschedule?token={customer_token}",
+            json={"start_time": target}
+        ).status_code
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # e.g. SAWarning from locking a session twice
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            statuses = sorted(pool.map(reschedule, [appointment.id for appointment in appointments]))
+    assert statuses == [200, 409]
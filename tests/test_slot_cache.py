@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+from conftest import CUSTOMER_PHONE
+
+DAY = date.today() + timedelta(days=1)
+
+
+def at(hour: int) -> str:
+    return datetime.combine(DAY, datetime.min.time()).replace(hour=hour).isoformat()
+
+
+def cache_stats(client, admin_headers):
+    response = client.get("/panel/cache-stats", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()["availability"]
+
+
+def test_cached_slots_are_refreshed_after_every_schedule_change(client, admin_headers, customer_token, make_barber):
+    barber_id, service_id = make_barber()
+
+    def slots():
+        response = client.get(
+            f"/availability?date_str={DAY}&barber_id={barber_id}&barber_service_id={service_id}"
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["slots"]
+
+    def book(hour):
+        response = client.post(f"/book?customer_token={customer_token}", json={
+            "customer_name": "Cliente", "customer_phone": CUSTOMER_PHONE,
+            "barber_id": barber_id, "barber_service_id": service_id, "start_time": at(hour)
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    # Counters: a first lookup misses, the same lookup again hits
+    before = cache_stats(client, admin_headers)
+    initial = slots()
+    assert slots() == initial
+    after = cache_stats(client, admin_headers)
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+    assert {"09:00", "10:00", "11:00"} <= set(initial)
+
+    # Booking takes the slot
+    appointment_id = book(10)
+    assert "10:00" not in slots()
+
+    # Cancelling gives it back
+    response = client.post(f"/customer/appointments/{appointment_id}/cancel?token={customer_token}")
+    assert response.status_code == 200, response.text
+    assert "10:00" in slots()
+
+    # A status change frees it too (only scheduled appointments block slots)
+    appointment_id = book(11)
+    assert "11:00" not in slots()
+    response = client.put(f"/panel/appointments/{appointment_id}/no-show", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert "11:00" in slots()
+
+    # New working hours apply to days already cached
+    response = client.put(f"/panel/barbers/{barber_id}", json={"start_time": "12:00"}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert slots()[0] == "12:00"
@@ -0,0 +1,43 @@
+import random
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from occupancy import DayOccupancy, format_minute
+
+
+def original_loop_slots(work_start, work_end, break_start, break_end, duration_minutes, appointments):
+    """The original get_availability loop: every candidate vs every appointment"""
+    slots = []
+    current_time = work_start
+    while current_time + timedelta(minutes=duration_minutes) <= work_end:
+        slot_end = current_time + timedelta(minutes=duration_minutes)
+        if (current_time < break_end) and (slot_end > break_start):
+            current_time += timedelta(minutes=30)
+            continue
+        if not any(current_time < apt.end_time and slot_end > apt.start_time for apt in appointments):
+            slots.append(current_time.strftime("%H:%M"))
+        current_time += timedelta(minutes=30)
+    return slots
+
+
+@pytest.mark.parametrize("duration", [15, 30, 45, 60, 90])
+def test_bitmap_slots_match_the_original_loop(duration):
+    rng = random.Random(42)
+    day = date(2030, 1, 7)
+    base = datetime.combine(day, datetime.min.time())
+    work_start, work_end = base.replace(hour=8), base.replace(hour=20)
+    break_start, break_end = base.replace(hour=12), base.replace(hour=13)
+    appointments = []
+    for _ in range(16):
+        start = base.replace(hour=rng.randint(8, 19), minute=rng.choice([0, 15, 30, 45]))
+        appointments.append(SimpleNamespace(start_time=start, end_time=start + timedelta(minutes=rng.choice([20, 30, 45]))))
+
+    occupancy = DayOccupancy.from_intervals(day, ((a.start_time, a.end_time) for a in appointments))
+    occupancy.mark(break_start, break_end)
+    minutes = occupancy.free_minutes(
+        duration, occupancy.minute_of(work_start), occupancy.minute_of(work_end), 30
+    )
+    assert [format_minute(minute) for minute in minutes] == \
+        original_loop_slots(work_start, work_end, break_start, break_end, duration, appointments)
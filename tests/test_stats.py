@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+import models
+import stats
+from conftest import CUSTOMER_PHONE
+
+
+def book(client, barber_id, service_id, start):
+    response = client.post("/book", json={
+        "customer_name": "Cliente",
+        "customer_phone": CUSTOMER_PHONE,
+        "barber_id": barber_id,
+        "barber_service_id": service_id,
+        "start_time": start.isoformat()
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def rollup_matches_appointments(db, start_day, end_day):
+    expected = stats.aggregate(db, start_day, end_day)
+    for data in expected.values():
+        del data["booked"]
+    rollup = {
+        key: data for key, data in stats.read_rollup(db, start_day, end_day).items()
+        if data["active"] or data["cancelled"] or data["revenue_cents"]
+    }
+    assert rollup == {key: {**data, "booked": 0} for key, data in expected.items()}
+
+
+def test_rollup_follows_bookings_cancellations_and_reschedules(client, db, customer_token, make_barber):
+    barber_id, service_id = make_barber()
+    day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    first = book(client, barber_id, service_id, day.replace(hour=9))
+    second = book(client, barber_id, service_id, day.replace(hour=10))
+    book(client, barber_id, service_id, day.replace(hour=11))
+    db.query(models.Appointment).update({"customer_id": db.query(models.Customer.id).scalar()})
+    db.commit()
+
+    assert client.post(f"/customer/appointments/{first}/cancel?token={customer_token}").status_code == 200
+    response = client.post(
+        f"/customer/appointments/{second}/reschedule?token={customer_token}",
+        json={"start_time": (day + timedelta(days=1)).replace(hour=9).isoformat()}
+    )
+    assert response.status_code == 200, response.text
+
+    rollup_matches_appointments(db, day.date(), day.date() + timedelta(days=1))
+
+
+def test_rolled_back_changes_never_reach_the_rollup(db, make_barber):
+    barber_id, service_id = make_barber()
+    start = datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).replace(hour=9)
+    appointment = models.Appointment(
+        customer_name="Cliente", customer_phone=CUSTOMER_PHONE, barber_id=barber_id,
+        barber_service_id=service_id, start_time=start, end_time=start + timedelta(minutes=30),
+        **stats.service_snapshot(barber_service=db.get(models.BarberService, service_id))
+    )
+    db.add(appointment)
+    stats.record_appointments(db, [appointment], 1)
+    db.rollback()
+    db.commit()
+
+    assert stats.read_rollup(db, start.date(), start.date()) == {}
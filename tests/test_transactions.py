@@ -0,0 +1,61 @@
+"""Read-then-write endpoints must survive writers committing in between."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import database
+import models
+from routers import admin
+
+
+def add_appointments(db, barber_id: int, service_id: int, count: int):
+    day = datetime.combine(date.today() + timedelta(days=2), datetime.min.time())
+    appointments = [
+        models.Appointment(
+            customer_name="Cliente", customer_phone="11999990000", barber_id=barber_id,
+            barber_service_id=service_id, start_time=day + timedelta(hours=9, minutes=30 * i),
+            end_time=day + timedelta(hours=9, minutes=30 * i + 30), status="scheduled"
+        )
+        for i in range(count)
+    ]
+    db.add_all(appointments)
+    db.commit()
+    return [appointment.id for appointment in appointments]
+
+
+def test_write_after_read_when_another_writer_commits_in_between(db, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    [appointment_id] = add_appointments(db, barber_id, service_id, 1)
+
+    reader = database.SessionLocal()
+    try:
+        appointment = reader.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+        slot = datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).replace(hour=10)
+        assert book_slot(barber_id, service_id, slot) == 200
+        appointment.status = "completed"
+        reader.commit()
+    finally:
+        reader.close()
+    db.expire_all()
+    assert db.get(models.Appointment, appointment_id).status == "completed"
+
+
+def test_status_changes_run_concurrently_with_bookings(db, make_barber, book_slot):
+    barber_id, service_id = make_barber()
+    appointment_ids = add_appointments(db, barber_id, service_id, 16)
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+
+    def complete(appointment_id):
+        session = database.SessionLocal()
+        try:
+            return admin.complete_appointment(appointment_id, session, None)["status"]
+        finally:
+            session.close()
+
+    def book(i):
+        return book_slot(barber_id, service_id, tomorrow + timedelta(days=i // 16, hours=9, minutes=30 * (i % 16)))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        completed = [pool.submit(complete, appointment_id) for appointment_id in appointment_ids]
+        booked = [pool.submit(book, i) for i in range(16)]
+        assert [future.result() for future in completed] == ["completed"] * len(appointment_ids)
+        assert [future.result() for future in booked] == [200] * 16